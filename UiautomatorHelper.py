@@ -5,35 +5,246 @@
 # Environment: Python3.6
 # Description: A program like Android Uiautomator Viewer by Python pyqt5
 
-import sys, os, time, subprocess, traceback
-
-try:
-    from PyQt5.QtWidgets import QDialog, QHeaderView, QAbstractItemView , QMenu, QFileDialog, QMainWindow, QMessageBox, \
-        QAction, QToolBar,QTableWidget,QGroupBox,QLineEdit, QApplication, QWidget, QFrame, QHBoxLayout, QPushButton, \
-        QTreeWidget, QSplitter, QLabel, QTableView, QTreeWidgetItem, QVBoxLayout, QBoxLayout
-except:
-    print("PyQt5 installing...")
-    subprocess.run('pip install -U PyQt5')
-    from PyQt5.QtWidgets import QDialog, QHeaderView, QAbstractItemView, QMenu, QFileDialog, QMainWindow, QMessageBox, \
-        QAction, QToolBar, QTableWidget, QGroupBox, QLineEdit, QApplication, QWidget, QFrame, QHBoxLayout, QPushButton, \
-        QTreeWidget, QSplitter, QLabel, QTableView, QTreeWidgetItem, QVBoxLayout, QBoxLayout
-
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QStandardItemModel, QPixmap, QStandardItem, QIcon, QCursor
-
-try:
-    import uiautomator2 as u2
-except:
-    print("uiautomator2 installing...")
-    subprocess.run('pip install -U uiautomator2')
-    import uiautomator2 as u2
-
-try:
-    import pyperclip
-except:
-    subprocess.run('pip install pyperclip')
-    import pyperclip
+import sys, os, time, json, argparse, traceback
+
+STARTED = time.perf_counter()  # Startup timings are measured from here
+
+from PyQt5.QtWidgets import QDialog, QHeaderView, QAbstractItemView , QMenu, QFileDialog, QMainWindow, QMessageBox, \
+    QAction, QToolBar,QTableWidget,QGroupBox,QLineEdit, QApplication, QWidget, QFrame, QHBoxLayout, QPushButton, \
+    QSplitter, QLabel, QTableView, QVBoxLayout, QBoxLayout, QTreeView, QProgressDialog, \
+    QSpinBox, QListWidget, QDockWidget, QTableWidgetItem
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex, QTimer, QThread, pyqtSignal, QBuffer, QByteArray, \
+    QIODevice, QEvent
+from PyQt5.QtGui import QStandardItemModel, QPixmap, QStandardItem, QIcon, QCursor, QImage, QPainter, QPen, QColor
+
+from collections import OrderedDict
+
+from uix_engine import parse_uix, format_uix, find_screenshot, SpatialIndex
+from uix_cache import DumpCache
+from device_capture import Capture, CaptureCancelled, DeviceSessions, ReplayCapture, parse_raw, RAW_BPP
+from uix_diff import TreeDiff
+from uix_query import QueryEngine, SearchIndex
+from uix_trace import tracer
+from uix_bundle import Bundle, write_bundle, is_bundle, BUNDLE_EXT
+
+
+def connect_device(serial=None):
+    """Connect to device with uiautomator2, imported on first device capture instead of at startup"""
+    try:
+        import uiautomator2
+    except ImportError:
+        raise ImportError("Device capture needs uiautomator2: pip install -U uiautomator2")
+    return uiautomator2.connect(serial)
+
+
+def copy_text(text):
+    """Copy text to clipboard with pyperclip, imported on first copy, with the Qt clipboard if it is missing"""
+    try:
+        import pyperclip
+        pyperclip.copy(text)
+    except Exception:  # Not installed, or no clipboard tool found by pyperclip
+        QApplication.clipboard().setText(text)
+
+
+# QImage formats laid out in memory like screencap raw pixel formats, Qt reads the pixels as they are
+RAW_QIMAGE_FORMATS = {1: QImage.Format_RGBA8888, 2: QImage.Format_RGBX8888, 3: QImage.Format_RGB888,
+                      4: QImage.Format_RGB16, 5: QImage.Format_ARGB32 if sys.byteorder == 'little' else None}
+SEARCH_MARKS = 2000  # Search matches marked on the screenshot, more are only listed in the tree
+SEARCH_EXPAND = 2000  # Filtered tree is expanded when it shows at most this many nodes
+LEAN_BYTES = 32 << 20  # Dump files larger than this are opened lean, see get_all_elements()
+LEAN_VALUE = 1024  # Longest property value kept in memory when lean, longer ones are read from the file
+
+
+@tracer.traced('decode')
+def screenshot_pixmap(data):
+    """QPixmap from PNG bytes or screencap raw frame, null pixmap if data can not be decoded"""
+    pic = QPixmap()
+    if data.startswith(b'\x89PNG'):
+        pic.loadFromData(data, 'PNG')
+        return pic
+    width, height, fmt, offset = parse_raw(data)
+    if RAW_QIMAGE_FORMATS.get(fmt) is None:
+        return pic
+    # Wrap the pixels in place through a view (slicing bytes would copy the frame), fromImage does the only copy
+    with memoryview(data) as view:
+        image = QImage(view[offset:], width, height, width * RAW_BPP[fmt], RAW_QIMAGE_FORMATS[fmt])
+        return QPixmap.fromImage(image)
+
+
+class NodeTreeModel(QAbstractItemModel):
+    """Tree model over NodeStore child lists, the view only asks for rows of expanded branches"""
+
+    def __init__(self, nodes, parent=None):
+        super(NodeTreeModel, self).__init__(parent)
+        self.nodes = nodes
+        self.shown = None  # Node -> shown children when filtered, top nodes at -1
+        self.rows = None  # Node -> row among shown children when filtered
+
+    def set_filter(self, found):
+        """Show only found nodes and their ancestors, all nodes if found is None"""
+        self.beginResetModel()
+        if found is None:
+            self.shown = self.rows = None
+        else:
+            parent = self.nodes.parent
+            shown = {-1: []}
+            for i in found:  # Document order, so children are added to shown lists in order
+                path = []
+                while i not in shown:
+                    shown[i] = []
+                    path.append(i)
+                    i = parent[i]
+                for c in reversed(path):
+                    shown[parent[c]].append(c)
+            self.shown = shown
+            self.rows = dict((c, row) for children in shown.values() for row, c in enumerate(children))
+        self.endResetModel()
+
+    def node_index(self, i):
+        """Model index of node, invalid if it is filtered out"""
+        if self.rows is not None:
+            row = self.rows.get(i)
+            return self.createIndex(row, 0, i) if row is not None else QModelIndex()
+        return self.createIndex(self.nodes.row[i], 0, i)
+
+    def index(self, row, column, parent=QModelIndex()):
+        p = parent.internalId() if parent.isValid() else -1
+        if row < 0 or column != 0 or row >= self.rowCount(parent):
+            return QModelIndex()
+        if self.shown is not None:
+            return self.createIndex(row, column, self.shown[p][row])
+        return self.createIndex(row, column, self.nodes.child(p, row))
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        p = self.nodes.parent[index.internalId()]
+        if p < 0:
+            return QModelIndex()
+        return self.node_index(p)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        p = parent.internalId() if parent.isValid() else -1
+        if self.shown is not None:
+            return len(self.shown.get(p, ()))
+        return self.nodes.child_count(p)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        return self.rowCount(parent) > 0
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        return self.label(index.internalId())
+
+    def label(self, i):
+        """Node information to display: (index) class text {content-desc} bounds"""
+        nodes = self.nodes
+        cls = nodes.value(i, 'class')
+        sp = ":" if "android.widget.TextView" in cls else " "
+        # Values left in the dump file are not read to paint a row
+        desc = "..." if nodes.is_deferred(i, 'content-desc') else nodes.value(i, 'content-desc')
+        cd = " {" + desc + "} " if len(desc) > 0 else ""
+        text = "..." if nodes.is_deferred(i, 'text') else nodes.value(i, 'text')
+        return "(" + nodes.value(i, 'index') + ") " + cls.split("android.widget.")[-1] + sp + \
+               text + cd + " " + nodes.value(i, 'bounds')
+
+
+class CaptureThread(QThread):
+    """Capture screenshot and uiautomator dump from device in background"""
+    progress = pyqtSignal(str)  # Name of finished step
+    captured = pyqtSignal(object, bytes, str)  # Device, screenshot PNG or raw frame, uiautomator dump xml
+    failed = pyqtSignal(str)  # Error, empty if cancelled
+
+    def __init__(self, parent=None, capture=None):
+        super(CaptureThread, self).__init__(parent)
+        self.capture = capture or Capture(parent.sessions, raw=parent.rawAction.isChecked())
+
+    def cancel(self):
+        self.capture.cancel()
+
+    def run(self):
+        try:
+            screenshot, xml = self.capture.run(self.progress.emit)
+            self.captured.emit(self.capture.device, screenshot, xml)
+        except CaptureCancelled:
+            self.failed.emit("")
+        except Exception:
+            self.failed.emit(traceback.format_exc())
+
+
+class CompareDialog(QDialog):
+    """Differences between two dumps, highlighted on both screenshots"""
+    COLORS = {'removed': QColor(255, 0, 0), 'inserted': QColor(0, 200, 0), 'moved': QColor(0, 0, 255),
+              'changed': QColor(255, 150, 0)}
+    HEIGHT = 600  # Height of displayed screenshots
+
+    def __init__(self, diff, pic_a, pic_b, parent=None):
+        super(CompareDialog, self).__init__(parent)
+        self.diff = diff
+        self.records = list(diff.records())
+        summary = diff.summary()
+        self.setWindowTitle("Compare: {inserted} inserted, {removed} removed, {moved} moved, "
+                            "{changed} changed".format(**summary))
+
+        # Marks of both screenshots, for inserted and removed subtrees only the top node
+        a, b, match_a = diff.a, diff.b, diff.match_a
+        removed = set(diff.removed)
+        inserted = set(diff.inserted)
+        self.marks = ([(i, 'removed') for i in diff.removed if a.parent[i] not in removed],
+                      [(j, 'inserted') for j in diff.inserted if b.parent[j] not in inserted])
+        for op, found in (('moved', diff.moved), ('changed', diff.changed)):
+            self.marks[0].extend((i, op) for i in found)
+            self.marks[1].extend((match_a[i], op) for i in found)
+        self.pics = []
+        self.rates = []  # Screenshot pixels per displayed pixel
+        for nodes, pic in ((a, pic_a), (b, pic_b)):
+            if pic.isNull():  # No screenshot, use blank one of screen size
+                pic = QPixmap(max(max(nodes.right, default=0), 1), max(max(nodes.bottom, default=0), 1))
+                pic.fill(Qt.white)
+            self.pics.append(pic.scaledToHeight(self.HEIGHT, Qt.SmoothTransformation))
+            self.rates.append(pic.height() / self.HEIGHT)
+
+        self.imgs = [QLabel(), QLabel()]
+        self.changes = QListWidget()
+        for record in self.records:
+            self.changes.addItem("{}  {}  {}  {}".format(record['op'], record['class'].split('.')[-1],
+                                                         record['text'], record['bounds']))
+        self.changes.currentRowChanged.connect(self.paint)
 
+        hbox = QHBoxLayout()
+        for img in self.imgs:
+            hbox.addWidget(img)
+        hbox.addWidget(self.changes)
+        self.setLayout(hbox)
+        self.paint(-1)
+
+    def paint(self, row):
+        """Draw marks on both screenshots, the selected difference with a thicker frame"""
+        selected = self.records[row] if 0 <= row < len(self.records) else None
+        for side in (0, 1):
+            nodes = self.diff.a if side == 0 else self.diff.b
+            pic = QPixmap(self.pics[side])
+            painter = QPainter(pic)
+            rate = self.rates[side]
+            for i, op in self.marks[side]:
+                painter.setPen(QPen(self.COLORS[op], 1))
+                left, top, right, bottom = nodes.rect(i)
+                painter.drawRect(int(left / rate), int(top / rate), int((right - left) / rate),
+                                 int((bottom - top) / rate))
+            i = selected[('a', 'b')[side]] if selected is not None else None
+            if i is not None:
+                painter.setPen(QPen(self.COLORS[selected['op']], 4))
+                left, top, right, bottom = nodes.rect(i)
+                painter.drawRect(int(left / rate), int(top / rate), int((right - left) / rate),
+                                 int((bottom - top) / rate))
+            painter.end()
+            self.imgs[side].setPixmap(pic)
 
 
 class myApp(QMainWindow):
@@ -65,12 +276,74 @@ class myApp(QMainWindow):
         dumpAction.triggered.connect(self.dump_files) # Get screenshot and uiautomator dump from device
         self.toolbar.addAction(dumpAction)
 
+        # Add action: capture raw framebuffer instead of PNG, faster on high resolution devices with fast USB
+        self.rawAction = QAction('Raw', self)
+        self.rawAction.setCheckable(True)
+        self.rawAction.setToolTip("Capture raw framebuffer, skip PNG encoding on device")
+        self.toolbar.addAction(self.rawAction)
+
         # Add icon and action: save screenshot and uiautomator dump
         saveAction = QAction(QIcon('save.jpg'), 'Save', self)
         saveAction.setShortcut('Ctrl+S')
         saveAction.triggered.connect(self.save_files) # Save screenshot and uiautomator dump
         self.toolbar.addAction(saveAction)
 
+        # Add action: save shown screenshot, dump and parsed nodes as one bundle file, opened without parsing
+        saveBundleAction = QAction('Save Bundle', self)
+        saveBundleAction.setShortcut('Ctrl+Shift+S')
+        saveBundleAction.setToolTip("Save shown screenshot and uiautomator dump as one " + BUNDLE_EXT + " file")
+        saveBundleAction.triggered.connect(self.save_bundle)
+        self.toolbar.addAction(saveBundleAction)
+
+        # Add action: live mirror, capture again and again and update only the nodes which changed
+        self.liveAction = QAction('Live', self)
+        self.liveAction.setCheckable(True)
+        self.liveAction.setToolTip("Mirror device screen, captures are repeated after the interval")
+        self.liveAction.toggled.connect(self.live_toggled)
+        self.toolbar.addAction(self.liveAction)
+
+        # Live mirror interval between the start of two captures
+        self.liveInterval = QSpinBox()
+        self.liveInterval.setRange(0, 10000)
+        self.liveInterval.setSingleStep(100)
+        self.liveInterval.setValue(300)
+        self.liveInterval.setSuffix(" ms")
+        self.liveInterval.setToolTip("Live mirror interval")
+        self.toolbar.addWidget(self.liveInterval)
+
+        # Add action: replay saved screenshot and uiautomator dump pairs as live mirror
+        replayAction = QAction('Replay', self)
+        replayAction.setToolTip("Replay saved screenshots and uiautomator dumps of a directory")
+        replayAction.triggered.connect(self.replay_files)
+        self.toolbar.addAction(replayAction)
+
+        # Add action: compare shown uiautomator dump with a saved one
+        compareAction = QAction('Compare', self)
+        compareAction.setToolTip("Compare with saved uiautomator dump")
+        compareAction.triggered.connect(self.compare_files)
+        self.toolbar.addAction(compareAction)
+
+        # Add action: inspect the node under the mouse pointer without clicking
+        self.hoverAction = QAction('Hover', self)
+        self.hoverAction.setCheckable(True)
+        self.hoverAction.setShortcut('Ctrl+H')
+        self.hoverAction.setToolTip("Inspect the node under the mouse pointer while it moves over the screenshot")
+        self.hoverAction.toggled.connect(self.hover_toggled)
+        self.toolbar.addAction(self.hoverAction)
+
+        # Add action: record timing spans and counters, and show them in the stats panel
+        self.traceAction = QAction('Trace', self)
+        self.traceAction.setCheckable(True)
+        self.traceAction.setToolTip("Time loading, hit-tests and drawing, see the stats panel")
+        self.traceAction.toggled.connect(self.trace_toggled)
+        self.toolbar.addAction(self.traceAction)
+
+        # Add action: save recorded spans as Chrome trace JSON
+        saveTraceAction = QAction('Save Trace', self)
+        saveTraceAction.setToolTip("Save timing spans as Chrome trace JSON (chrome://tracing, ui.perfetto.dev)")
+        saveTraceAction.triggered.connect(self.save_trace)
+        self.toolbar.addAction(saveTraceAction)
+
         # Main application screen
         cw = QWidget()
         hbox = QHBoxLayout()
@@ -104,6 +377,12 @@ class myApp(QMainWindow):
         # Add label to left frame for screenshot display
         self.img = QLabel(self.leftFrame)  # Use to show screenshot
         self.mark = QLabel(self.leftFrame)  # Use to mark clicked element
+        self.hits = QLabel(self.leftFrame)  # Use to mark search matches
+        self.hits.stackUnder(self.mark)
+        # Mouse events go through the marks to the screenshot, in its own coordinates
+        self.mark.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.hits.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.img.installEventFilter(self)
         self.leftFrame.setMinimumSize(120,160)
 
         # Add layout for label
@@ -114,12 +393,24 @@ class myApp(QMainWindow):
         cw.setLayout(hbox)
         self.setCentralWidget(cw)
 
+        # Coalesce window resize events, screenshot is scaled once resizing pauses
+        self.scaled = OrderedDict()  # Scaled screenshots by size, most recently used last
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(30)
+        self.resize_timer.timeout.connect(self.resize_done)
+
+        # Coalesce hover mouse moves, only the latest pointer position is hit-tested once per frame
+        self.hover_pos = None
+        self.hover_timer = QTimer(self)
+        self.hover_timer.setSingleShot(True)
+        self.hover_timer.setInterval(16)
+        self.hover_timer.timeout.connect(self.hover_done)
+
         # load_first_time == True, not load XML
         self.load_first_time = True
         # Display default image
-        self.uipng = 'dump.png'
-        # Display default image
-        self.display_img()
+        self.set_screenshot('dump.png')
 
         # Add buttons, lineEdit, point info label to right top frame
         # Expand All button
@@ -158,14 +449,29 @@ class myApp(QMainWindow):
         operation = QFrame()
         operation.setLayout(oprBox)
 
-        # Add treewidget for all Nodes
-        self.tree = QTreeWidget()
+        # Search box, filters tree to nodes whose text, content-desc, resource-id or class has words starting
+        # with the typed words
+        self.searchBox = QLineEdit()
+        self.searchBox.setPlaceholderText("Search text, content-desc, resource-id, class")
+        self.searchBox.setClearButtonEnabled(True)
+        self.searchInfo = QLabel()
+
+        searchBox = QHBoxLayout()
+        searchBox.setContentsMargins(0, 0, 5, 0)
+        searchBox.addWidget(self.searchBox)
+        searchBox.addWidget(self.searchInfo)
+
+        # Add treeview for all Nodes
+        self.tree = QTreeView()
         self.tree.header().setVisible(False)
+        self.tree.setUniformRowHeights(True)
+        self.tree.clicked.connect(self.itemClick)
 
         # Use QVBoxLayout to contain operation frame and tree widget
         vbox = QVBoxLayout()
         vbox.setContentsMargins(10, 5, 5, 5)
         vbox.addWidget(operation)
+        vbox.addLayout(searchBox)
         vbox.addWidget(self.tree)
 
         # Set as right top frame layout
@@ -179,6 +485,14 @@ class myApp(QMainWindow):
         # Add TableView
         self.props = QTableView()
 
+        # Copy selected property values, with Ctrl+C or from the context menu
+        copyAction = QAction('Copy', self.props)
+        copyAction.setShortcut('Ctrl+C')
+        copyAction.setShortcutContext(Qt.WidgetShortcut)
+        copyAction.triggered.connect(self.copy_props)
+        self.props.addAction(copyAction)
+        self.props.setContextMenuPolicy(Qt.ActionsContextMenu)
+
         # Add tableView to layout
         hbox2 = QHBoxLayout()
         hbox2.addWidget(self.props)
@@ -194,14 +508,64 @@ class myApp(QMainWindow):
         # Set layout for right bottom frame
         self.rightBottom.setLayout(vbox2)
 
+        # Stats panel: timing of every span name and counter values, refreshed while tracing
+        self.stats = QTableWidget(0, 5)
+        self.stats.setHorizontalHeaderLabels(['Span', 'Count', 'Last ms', 'Mean ms', 'Max ms'])
+        self.stats.verticalHeader().setVisible(False)
+        self.stats.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.statsDock = QDockWidget("Stats", self)
+        self.statsDock.setWidget(self.stats)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.statsDock)
+        self.statsDock.setVisible(False)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(500)
+        self.stats_timer.timeout.connect(self.show_stats)
+
         # Set signal for botton
         self.expandAllBtn.clicked.connect(self.tree.expandAll)
         self.preBtn.clicked.connect(self.pre_node)
         self.nextBtn.clicked.connect(self.next_node)
 
+        # Coalesce search box keystrokes typed faster than the tree and marks update
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(30)
+        self.search_timer.timeout.connect(self.search_done)
+        self.searchBox.textChanged.connect(self.search_timer.start)
+
+        # Cache of parsed dumps
+        self.cache = DumpCache()
+        # Device connections, reused across captures
+        self.sessions = DeviceSessions(connect_device)  # uiautomator2 is imported on first capture
+        # Background device capture
+        self.capture_thread = None
+
+        # Live mirror: timer for the next capture, and function returning the capture to run
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.timeout.connect(self.live_tick)
+        self.live_source = None
+        self.live_started = 0
+        # Last live screenshot and uiautomator dump, the same ones are not decoded again
+        self.live_screenshot = None
+        self.live_xml = None
+
+        # Locator evaluation on shown nodes, rebuilt when nodes change
+        self.query_engine = None
+        # Word index of shown nodes for the search box, and nodes the tree is filtered to
+        self.search_index = None
+        self.search_found = None
+
+        # Dump file of shown nodes, None when they come from self.xml (device capture)
+        self.dump_source = None
+        # Keep long property values in dump files, on with --lean and always for large files
+        self.lean = False
+
         # Init focus index for treeview
+        self.nodes = None
         self.focus_index = None
         self.resize(700, 500)
+        self.traceAction.setChecked(tracer.enabled)  # Tracing from start when UIAUTOMATORHELPER_TRACE is set
 
 
     def load_files(self):
@@ -295,10 +659,11 @@ class myApp(QMainWindow):
             path = os.path.split(self.le2.text())[0]
         else:
             path = "/"
-        fname = QFileDialog.getOpenFileName(self, caption='Open File', directory=path, filter="*.xml;*.uix")
+        fname = QFileDialog.getOpenFileName(self, caption='Open File', directory=path,
+                                            filter="*.xml;*.uix;*" + BUNDLE_EXT)
         if fname[0]:
             self.le2.setText(fname[0])
-        if len(self.le1.text())>0 and len(self.le2.text())>0:
+        if len(self.le1.text())>0 and len(self.le2.text())>0 or is_bundle(self.le2.text()):  # Bundle has screenshot
             self.okbtn.setEnabled(True)
 
     def open_files(self):
@@ -306,65 +671,297 @@ class myApp(QMainWindow):
         self.device = None
         try:
             self.dialog.close()
-            self.load_first_time = False
-            self.uipng = None
-            self.uipng = QPixmap(self.le1.text())  # Set current screenshot file
-            self.display_img()  # Display screenshot
-            self.uix_update(self.le2.text())  # Update uiautomator dump file
-            self.get_all_elements(self.le2.text())  # Get all elements from uiautomator dump
+            self.open_dump(self.le2.text(), self.le1.text())
         except:
             QMessageBox.critical(self, "Exception",
                                  "Load files error:\n" + traceback.format_exc(),
                                  QMessageBox.Ok)
 
+    def open_dump(self, uix, png):
+        """Display screenshot file and load uiautomator dump file, or a bundle of both"""
+        if is_bundle(uix):
+            self.open_bundle(uix)
+            return
+        self.load_first_time = False
+        self.set_screenshot(png)  # Set current screenshot file and display it
+        self.get_all_elements(uix)  # Get all elements from uiautomator dump
+
+    @tracer.traced('bundle')
+    def open_bundle(self, path):
+        """Display screenshot and nodes of bundle, node table and spatial index are mapped, not parsed"""
+        with Bundle(path) as bundle:
+            pic = screenshot_pixmap(bundle.screenshot())
+            nodes, spatial = bundle.nodes(), bundle.spatial()
+        if pic.isNull():
+            raise ValueError("Screenshot of bundle can not be decoded: " + path)
+        self.load_first_time = False
+        self.set_screenshot(pic)
+        self.nodes, self.spatial = nodes, spatial
+        self.dump_source = path
+        with tracer.span('search.index'):
+            self.search_index = SearchIndex(self.nodes)
+        tracer.count('nodes', len(self.nodes))
+        self.get_nodes()
+
+    def dump_data(self):
+        """Uiautomator dump bytes of shown nodes"""
+        if self.dump_source is None:
+            return self.xml.encode('utf-8')
+        if is_bundle(self.dump_source):
+            with Bundle(self.dump_source) as bundle:
+                return bundle.hierarchy()
+        with open(self.dump_source, 'rb') as f:
+            return f.read()
+
+    def save_bundle(self):
+        """Save shown screenshot, uiautomator dump, node table and spatial index as one bundle file"""
+        if self.load_first_time or self.nodes is None:
+            QMessageBox.information(self, "Save Bundle", "Open or capture a uiautomator dump first.", QMessageBox.Ok)
+            return
+        tmp = time.strftime("%Y%m%d%H%M%S", time.localtime())
+        fname = QFileDialog.getSaveFileName(self, caption='Save Bundle', directory="dump_" + tmp + BUNDLE_EXT,
+                                            filter="*" + BUNDLE_EXT)
+        if not fname[0]:
+            return
+        try:
+            png = QByteArray()
+            buf = QBuffer(png)
+            buf.open(QIODevice.WriteOnly)
+            if not self.pic.save(buf, 'PNG'):
+                raise RuntimeError("Encode screenshot failed")
+            write_bundle(fname[0], bytes(png), self.dump_data(), self.nodes, self.spatial)
+        except Exception:
+            QMessageBox.critical(self, "Exception", "Save bundle failed.\n" + traceback.format_exc(), QMessageBox.Ok)
+
     def dump_files(self):
-        """Load screenshot and uiautomator dump from device"""
+        """Load screenshot and uiautomator dump from device, without blocking the window"""
+        if self.capture_thread is not None and self.capture_thread.isRunning():
+            return  # Capture in progress
+        self.capture_thread = CaptureThread(self)
+        self.capture_thread.progress.connect(self.dump_progress)
+        self.capture_thread.captured.connect(self.dump_done)
+        self.capture_thread.failed.connect(self.dump_failed)
+
+        self.capture_dialog = QProgressDialog("Capturing screenshot and UI hierarchy...", "Cancel", 0, 2, self)
+        self.capture_dialog.setWindowTitle("Device Screenshot")
+        self.capture_dialog.setMinimumDuration(300)
+        self.capture_dialog.setValue(0)
+        self.capture_dialog.canceled.connect(self.capture_thread.cancel)
+        self.start_capture(self.capture_thread)
+
+    def dump_progress(self, step):
+        """One capture step finished"""
+        self.capture_dialog.setLabelText(step + " done")
+        self.capture_dialog.setValue(self.capture_dialog.value() + 1)
+
+    def dump_done(self, device, screenshot, xml):
+        """Screenshot and uiautomator dump captured, display them from memory"""
+        self.capture_dialog.reset()
         try:
-            self.device = u2.connect()
-            subprocess.run("adb shell screencap /sdcard/ui.png")
-            # subprocess.run("adb shell uiautomator dump /sdcard/ui.uix")
-            subprocess.run("adb pull /sdcard/ui.png ui.png")
-            # subprocess.run("adb pull /sdcard/ui.uix ui.uix")
-            with open('ui.uix', 'w', encoding='utf-8') as f:
-                self.xml = self.device.dump_hierarchy()
-                f.write(self.xml)
-            self.uix_update()
-            if os.path.exists('ui.png') and os.path.exists('ui.uix'):
-                self.uipng = 'ui.png' # Set current screenshot file
+            self.device = device
+            self.xml = xml
+            pic = screenshot_pixmap(screenshot)
+            if not pic.isNull():
                 self.load_first_time = False
-                self.display_img() # Display screenshot
-                self.get_all_elements('ui.uix') # Get all elements from uiautomator dump
+                self.set_screenshot(pic) # Set current screenshot and display it
+                self.get_all_elements(xml.encode('utf-8')) # Get all elements from uiautomator dump
             else:
-                QMessageBox.critical(self, "Exception", "Load screenshot and uiautomator dump failed.\n"+traceback.format_exc(), QMessageBox.Ok)
-        except Exception as e:
-            print(traceback.format_exc())
+                QMessageBox.critical(self, "Exception", "Load screenshot and uiautomator dump failed.\n"
+                                                        "Screenshot can not be decoded.", QMessageBox.Ok)
+        except Exception:
+            QMessageBox.critical(self, "Exception", "Load screenshot and uiautomator dump failed.\n" +
+                                 traceback.format_exc(), QMessageBox.Ok)
+
+    def compare_files(self):
+        """Choose saved uiautomator dump and show its differences to the shown one"""
+        if self.load_first_time or self.nodes is None:
+            QMessageBox.information(self, "Compare", "Open or capture a uiautomator dump first.", QMessageBox.Ok)
+            return
+        fname = QFileDialog.getOpenFileName(self, caption='Compare With', directory='/',
+                                            filter="*.xml;*.uix;*" + BUNDLE_EXT)
+        if fname[0]:
+            self.compare_with(fname[0])
+
+    def compare_with(self, uix):
+        """Show differences from the shown dump to dump file uix or bundle, with its screenshot if any"""
+        try:
+            if is_bundle(uix):
+                with Bundle(uix) as bundle:
+                    other = bundle.nodes()
+                    pic = screenshot_pixmap(bundle.screenshot())
+            else:
+                other = parse_uix(uix)
+                png = find_screenshot(uix)
+                pic = QPixmap(png) if png is not None else QPixmap()
+            diff = TreeDiff(self.nodes, other)
+            self.compare_dialog = CompareDialog(diff, self.pic, pic, self)
+            self.compare_dialog.show()
+        except Exception:
+            QMessageBox.critical(self, "Exception", "Compare uiautomator dumps failed.\n" + traceback.format_exc(),
+                                 QMessageBox.Ok)
+
+    def live_toggled(self, on):
+        """Start or stop live mirror"""
+        if on:
+            if self.live_source is None:
+                self.live_source = lambda: Capture(self.sessions, raw=self.rawAction.isChecked())
+            self.live_timer.start(0)
+        else:
+            self.live_timer.stop()
+            self.live_source = None
+            self.live_screenshot = None
+            self.live_xml = None
+
+    def replay_files(self):
+        """Choose directory of saved screenshots and uiautomator dumps to replay"""
+        dir_path = QFileDialog.getExistingDirectory(self, "Choose Directory", '/')
+        if len(dir_path) == 0:  # Cancelled
+            return
+        self.start_replay(dir_path)
+
+    def start_replay(self, dir_path):
+        """Live mirror of saved screenshot and uiautomator dump pairs in name order, instead of device"""
+        from uix_batch import find_pairs  # Not needed until replay, keeps sqlite3 and multiprocessing out of startup
+        replay = ReplayCapture(find_pairs(dir_path))
+        self.liveAction.setChecked(False)
+        self.live_source = lambda: replay
+        self.liveAction.setChecked(True)
+
+    def live_tick(self):
+        """Start next live capture, unless a capture is still running"""
+        if self.capture_thread is not None and self.capture_thread.isRunning():
+            self.live_timer.start(self.liveInterval.value())
+            return
+        self.live_started = time.time()
+        self.capture_thread = CaptureThread(self, self.live_source())
+        self.capture_thread.captured.connect(self.live_done)
+        self.capture_thread.failed.connect(self.live_failed)
+        self.start_capture(self.capture_thread)
+
+    def start_capture(self, thread):
+        """Start capture thread, it is deleted once finished"""
+        thread.finished.connect(self.capture_finished)
+        thread.start()
+
+    def capture_finished(self):
+        """Capture thread finished after its results were delivered, free it"""
+        thread = self.sender()
+        if thread is self.capture_thread:
+            self.capture_thread = None
+        thread.deleteLater()  # The window is its parent and would keep it until closed
+
+    def live_done(self, device, screenshot, xml):
+        """Live capture finished, update screenshot and changed nodes, then schedule next capture"""
+        if not self.liveAction.isChecked():
+            return
+        tracer.add('live.frames')
+        try:
+            self.device = device
+            if screenshot != self.live_screenshot:  # Screen often does not change between captures
+                pic = screenshot_pixmap(screenshot)
+                if pic.isNull():
+                    raise ValueError("Screenshot can not be decoded")
+                self.load_first_time = False
+                self.set_screenshot(pic)
+                self.update_mark(self.focus_index)
+                self.live_screenshot = screenshot
+            self.xml = xml
+            if xml != self.live_xml:
+                self.update_nodes(xml.encode('utf-8'))
+                self.live_xml = xml
+        except Exception:
+            self.liveAction.setChecked(False)
+            QMessageBox.critical(self, "Exception", "Live mirror stopped.\n" + traceback.format_exc(), QMessageBox.Ok)
+            return
+        # Next capture starts one interval after this one started
+        wait = self.liveInterval.value() - int((time.time() - self.live_started) * 1000)
+        self.live_timer.start(max(wait, 0))
+
+    def live_failed(self, error):
+        """Live capture failed, stop live mirror"""
+        if error and self.liveAction.isChecked():
+            self.liveAction.setChecked(False)
+            QMessageBox.critical(self, "Exception", "Live mirror stopped.\n" + error, QMessageBox.Ok)
+
+    @tracer.traced('live.update')
+    def update_nodes(self, data):
+        """Show new dump of the same screen: patch changed rows and spatial index if tree shape is the same"""
+        with tracer.span('parse', bytes=len(data)):
+            nodes = parse_uix(data)
+        self.dump_source = None  # Live dump is in self.xml
+        changed = self.nodes.changed_nodes(nodes) if self.nodes is not None else None
+        tracer.count('nodes', len(nodes))
+        tracer.count('live.changed', len(changed) if changed is not None else len(nodes))
+        if changed is None:
+            self.reset_nodes(nodes)
+            return
+        self.spatial.update(nodes, changed)
+        self.nodes = self.tree_model.nodes = nodes
+        for i in changed:
+            index = self.tree_model.node_index(i)
+            if index.isValid():  # Not filtered out by search
+                self.tree_model.dataChanged.emit(index, index)
+        if changed and self.searchBox.text():
+            self.search_done()  # Matches may have changed with the values
+        if changed and self.focus_index is not None and self.focus_index >= 0:
+            self.draw_rect(self.focus_index)  # Selectors of any node may change with the other nodes
+        else:
+            self.update_mark(self.focus_index)
+
+    def reset_nodes(self, nodes):
+        """Show dump of a different tree, keep expanded and selected nodes which are still there"""
+        expanded = []
+        focus = None
+        if self.nodes is not None:
+            # Expanded nodes by absolute xpath, parents first
+            stack = [-1]
+            while stack:
+                p = stack.pop()
+                for c in self.nodes.children(p):
+                    if self.nodes.child_count(c) > 0 and self.tree.isExpanded(self.tree_model.node_index(c)):
+                        expanded.append(self.nodes.full_index_xpath(c))
+                        stack.append(c)
+            if self.focus_index is not None and self.focus_index >= 0:
+                focus = self.nodes.full_index_xpath(self.focus_index)
+        self.nodes, self.spatial = nodes, SpatialIndex(nodes)
+        self.get_nodes()
+        for xpath in expanded:
+            i = nodes.find_full_index_xpath(xpath)
+            if i is not None:
+                self.tree.setExpanded(self.tree_model.node_index(i), True)
+        self.focus_index = nodes.find_full_index_xpath(focus) if focus is not None else None
+        if self.focus_index is not None:
+            self.draw_rect(self.focus_index)
+            self.setItemSelected(self.focus_index)
+        else:
+            self.mark.setVisible(False)
+
+    def dump_failed(self, error):
+        """Capture failed or was cancelled (empty error)"""
+        self.capture_dialog.reset()
+        if error:
             QMessageBox.critical(self, "Exception", "Get screenshot and uiautomator dump error, need connect only "
-                                                    "one device to computer.\n"+traceback.format_exc()
-                                                    , QMessageBox.Ok)
+                                                    "one device to computer.\n" + error, QMessageBox.Ok)
 
     def save_files(self):
         """Save screenshot and uiautomator dump"""
         try:
-            self.device = u2.connect()
             dir_path = QFileDialog.getExistingDirectory(self, "Choose Directory", '/')
-            if len(dir_path) == 0:
-                print("No dir path selected")
+            if len(dir_path) == 0:  # Cancelled
                 return
             tmp = time.strftime("%Y%m%d%H%M%S",time.localtime())  # Generate time stamp for file name
 
-            # Save screenshot
-            subprocess.run("adb shell screencap /sdcard/ui.png")  # Capture screenshot and save to phone
-            subprocess.run("adb pull /sdcard/ui.png " + dir_path + "/dump_" + str(tmp) + ".png")  # Pull in screenshot
-
-            # Save uiautomator dump  ----Methor 1
-            # subprocess.run("adb shell uiautomator dump /sdcard/ui.uix")
-            # subprocess.run("adb pull /sdcard/ui.uix " + dir_path + "/dump_" + str(tmp) + ".uix")
-            # self.uix_update(dir_path + "/dump_" + str(tmp) + ".uix")
-
-            # Save uiautomator dump  ----Methor 2 , this methor contains much more elements than Methor 1
+            # Capture screenshot and uiautomator dump, reusing the device connection, then save them
+            capture = Capture(self.sessions, raw=self.rawAction.isChecked())
+            screenshot, self.xml = capture.run()
+            self.device = capture.device
+            if screenshot.startswith(b'\x89PNG'):
+                with open(dir_path + "/dump_" + str(tmp) + ".png", 'wb') as f:
+                    f.write(screenshot)
+            elif not screenshot_pixmap(screenshot).save(dir_path + "/dump_" + str(tmp) + ".png", 'PNG'):  # Encode raw frame
+                raise RuntimeError("Save screenshot failed")
             with open(dir_path + "/dump_" + str(tmp) + ".uix", 'w', encoding='utf-8') as f:
-                self.xml = self.device.dump_hierarchy()  # Get uiautomator dump
-                f.write(self.xml)
+                f.write(format_uix(self.xml.encode('utf-8')))  # One node per line, indented by nesting
 
             QMessageBox.information(self, "Saved", "Save screenshot and uiautomator dump successfully:\n" +
                                     dir_path + "/dump_" + str(tmp) + ".png\n" + dir_path + "/dump_" + str(tmp) + ".uix"
@@ -373,29 +970,132 @@ class myApp(QMainWindow):
             QMessageBox.critical(self, "Exception", "Save screenshot and uiautomator dump failed.\n" +
                                  traceback.format_exc(), QMessageBox.Ok)
 
+    def trace_toggled(self, on):
+        """Start or stop recording timing spans, with the stats panel"""
+        tracer.enabled = on
+        self.statsDock.setVisible(on)
+        if on:
+            self.stats_timer.start()
+        else:
+            self.stats_timer.stop()
+
+    def show_stats(self):
+        """Refresh stats panel from recorded spans and counters"""
+        if not self.statsDock.isVisible():
+            return
+        spans, counters = tracer.rows()
+        self.stats.setRowCount(len(spans) + len(counters))
+        rows = [(name, str(count), "{:.2f}".format(last), "{:.2f}".format(mean), "{:.2f}".format(most))
+                for name, count, last, mean, most in spans]
+        rows += [(name, str(value), "", "", "") for name, value in counters]
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.stats.setItem(row, column, QTableWidgetItem(value))
+
+    def save_trace(self):
+        """Save recorded timing spans and counters as Chrome trace JSON"""
+        fname = QFileDialog.getSaveFileName(self, caption='Save Trace', directory='trace.json', filter="*.json")
+        if not fname[0]:
+            return
+        try:
+            tracer.save(fname[0])
+        except OSError:
+            QMessageBox.critical(self, "Exception", "Save trace failed.\n" + traceback.format_exc(), QMessageBox.Ok)
+
     def mousePressEvent(self, event):
         """Get clicked point information"""
-        if self.load_first_time: # Not load image yet
+        if self.load_first_time or self.nodes is None: # Not load image yet
             return
-        # Ajust point location according screenshot location
-        x = event.x() - 10
-        y = event.y() - 43
-        if x < self.w and y < self.h:
-            # Map to point in screenshot original size
-            m = int(x * self.rate)
-            n = int(y * self.rate)
+        point = self.screen_point(self.img.mapFrom(self, event.pos()))
+        if point is not None:
+            m, n = point
             self.pointInfo.setText("({},{})".format(m,n))
             self.get_point_info(m,n)
 
+    def screen_point(self, pos):
+        """Point in screenshot original size of a position on the displayed screenshot, None outside it"""
+        if 0 <= pos.x() < self.w and 0 <= pos.y() < self.h:
+            return int(pos.x() * self.rate), int(pos.y() * self.rate)
+        return None
+
+    def hover_toggled(self, on):
+        """Start or stop inspecting the node under the mouse pointer"""
+        self.img.setMouseTracking(on)
+        if not on:
+            self.hover_timer.stop()
+            self.hover_pos = None
+
+    def eventFilter(self, obj, event):
+        """Keep the latest mouse position over the screenshot in hover mode"""
+        if obj is self.img and event.type() == QEvent.MouseMove and self.hoverAction.isChecked():
+            self.hover_pos = event.pos()
+            if not self.hover_timer.isActive():
+                self.hover_timer.start()  # Later moves before it fires only replace the position
+        return super().eventFilter(obj, event)
+
+    def hover_done(self):
+        """Hit-test the latest hover position, update mark, props and tree only when the node changes"""
+        pos, self.hover_pos = self.hover_pos, None
+        if pos is None or self.load_first_time or self.nodes is None:
+            return
+        point = self.screen_point(pos)
+        if point is None:
+            return
+        m, n = point
+        self.pointInfo.setText("({},{})".format(m,n))
+        with tracer.span('hit-test'):
+            found_index = self.spatial.find(m, n, self.pic_h * self.pic_w)
+        if found_index is None or found_index == self.focus_index:
+            return
+        with tracer.span('hover'):
+            self.focus_index = found_index
+            self.draw_rect(found_index)
+            self.setItemSelected(found_index)
+        tracer.add('hover.changes')
+
+    def closeEvent(self, event):
+        """Stop live mirror and background capture before the window goes away"""
+        self.liveAction.setChecked(False)
+        if self.capture_thread is not None and self.capture_thread.isRunning():
+            self.capture_thread.cancel()
+            self.capture_thread.wait()
+        if tracer.enabled and tracer.path:
+            tracer.save()
+        event.accept()
+
     def resizeEvent(self, event):
         """Window resize event"""
-        self.display_img()  # Update screenshot display
-        self.draw_rect(self.focus_index)  # update marked rect
+        self.resize_timer.start()  # Restart timer, only the last resize of a drag is handled
 
+    def resize_done(self):
+        """Update screenshot display and marked rect for the new window size"""
+        self.display_img()
+        self.update_mark(self.focus_index)
+        self.paint_hits()
+
+    def set_screenshot(self, uipng):
+        """Load screenshot from file or QPixmap once and display it"""
+        self.uipng = uipng
+        self.pic = uipng if isinstance(uipng, QPixmap) else QPixmap(uipng)
+        self.scaled.clear()
+        self.display_img()
+
+    def scaled_pic(self, w, h):
+        """Screenshot scaled to size, keep the last few sizes"""
+        key = (w, h)
+        pic = self.scaled.get(key)
+        if pic is None:
+            pic = self.scaled[key] = self.pic.scaled(w, h, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            if len(self.scaled) > 4:
+                self.scaled.popitem(last=False)
+        else:
+            self.scaled.move_to_end(key)
+        return pic
+
+    @tracer.traced('render.screenshot')
     def display_img(self):
-        """Load and display screenshot"""
+        """Display screenshot"""
         try:
-            self.pic = QPixmap(self.uipng)
             if self.load_first_time: # Load application first time, display default image
                 self.img.setPixmap(self.pic)
                 self.img.resize(self.pic.size())
@@ -411,166 +1111,78 @@ class myApp(QMainWindow):
                 self.rate = self.pic_w / self.leftFrame.width()
             self.h = self.pic_h / self.rate
             self.w = self.pic_w / self.rate
-            self.img.setPixmap(self.pic)
-            self.img.resize(self.w,self.h)  # Set screenshot size to fit for left frame
-            self.img.setScaledContents(True)
+            w, h = max(int(self.w), 1), max(int(self.h), 1)
+            self.img.setScaledContents(False)
+            self.img.setPixmap(self.scaled_pic(w, h))
+            self.img.resize(w, h)  # Set screenshot size to fit for left frame
             self.img.update()
         except Exception as e:
             print(e)
             print(traceback.format_exc())
 
 
+    @tracer.traced('load')
     def get_all_elements(self, uix='ui.uix'):
-        """Get all elements"""
+        """Get all elements from uiautomator dump file or bytes, errors are raised after clearing shown nodes"""
 
         if self.load_first_time:
             return
         try:
-            print('Get all elements')
-            with open(uix,'r',encoding='utf-8') as f:
-                self.uix = f.read()
-            xml = self.uix
-
-            self.elements = []
-            i = xml.count("<node ")
-            start = xml.find("<node ") + 6
-            end = xml.find(">", start)
-            while i > 0:
-                d = {}
-                if xml[end - 1] != "/":
-                    s = xml[start:end]
-                else:
-                    s = xml[start:end - 1]
-                s = s.strip()
-                t = s.split('" ')
-                for item in t:
-                    p = item.split("=")
-                    k = p[0]
-                    v = p[1].strip('"').replace("&amp;","&") 
-                    d[k] = v  # Add element's properties to dict
-                d['xpath'] = ""
-                d['fullIndexXpath'] = ""
-                d['uiaSelector'] = ""
-                d['indicator'] = ""
-                self.elements.append(d)
-                start = xml.find("<node ", end) + 6
-                end = xml.find(">", start)
-                i -= 1
-
-            for ele in self.elements:
-                flag = [False,False,False,False]
-                # Get uiautomator indicator: description < text < className < resourceId
-                # uiautomator indicator: for example self.device(indicator) can locate to single element
-                if len(ele['content-desc']) > 0:
-                    found_item = 0
-                    for item in self.elements:
-                        if item['content-desc'] == ele['content-desc']:
-                            found_item += 1
-                    if found_item == 1:
-                        flag[0] = True
-                        ele['indicator'] = 'description=\"{}\"'.format(ele['content-desc'])
-                        ele['uiaSelector'] = 'new UiSelector().description(\"{}\")'.format(ele['content-desc'])
-                if len(ele['text']) > 0:
-                    found_item = 0
-                    for item in self.elements:
-                        if item['text'] == ele['text']:
-                            found_item += 1
-                    if found_item == 1:
-                        flag[1] = True
-                        ele['indicator'] = 'text=\"{}\"'.format(ele['text'])
-                        ele['uiaSelector'] = 'new UiSelector().textContains(\"{}\")'.format(ele['text'])
-                if len(ele['class']) > 0:
-                    found_item = 0
-                    for item in self.elements:
-                        if item['class'] == ele['class']:
-                            found_item += 1
-                    if found_item == 1:
-                        flag[2] = True
-                        ele['indicator'] = 'className=\"{}\"'.format(ele['class'])
-                        ele['uiaSelector'] = 'new UiSelector().className(\"{}\")'.format(ele['class'])
-                if len(ele["resource-id"]) > 0:
-                    found_item = 0
-                    for item in self.elements:
-                        if item['resource-id'] == ele['resource-id']:
-                            found_item += 1
-                    if found_item == 1:
-                        flag[3] = True
-                        ele['indicator'] = 'resourceId=\"{}\"'.format(ele['resource-id'])
-                        ele['uiaSelector'] = 'new UiSelector().resourceId(\"{}\")'.format(ele['resource-id'])
-
-                # Get xpath
-                if flag[3]: # resourceId is indicator
-                    ele['xpath'] = '//' + ele['class'] + '[@resource-id=\"{}\"]'.format(ele['resource-id'])
-                elif flag[2]: # className is indicator
-                    ele['xpath'] = '//' + ele['class']
-                else:
-                    if len(ele['text']) > 0 and len(ele['content-desc']) > 0:
-                        ele['xpath'] = '//' + ele['class'] + '[@text=\"{}\" and @content-desc=\"{}\"]'.format(
-                            ele['text'],ele['content-desc'])
-                    if len(ele['text']) > 0 and len(ele['content-desc']) == 0:
-                        ele['xpath'] = '//' + ele['class'] + '[@text=\"{}\"]'.format(ele['text'])
-                    if len(ele['text']) == 0 and len(ele['content-desc']) > 0:
-                        ele['xpath'] = '//' + ele['class'] + '[@content-desc=\"{}\"]'.format(ele['content-desc'])
-
-                # Get uiaSelector
-                if ele['indicator'] == "":
-                    if len(ele['resource-id']) > 0:
-                        if len(ele['text']) > 0:
-                            ele['uiaSelector'] = 'new UiSelector().className(\"{}\").textContains(\"{}\").resourceId(' \
-                                                 '\"{}\")'.format(ele['class'], ele['text'], ele['resource-id'])
-                        else:
-                            ele['uiaSelector'] = 'new UiSelector().className(\"{}\").resourceId(' \
-                                                 '\"{}\")'.format(ele['class'], ele['resource-id'])
-                    else:
-                        if len(ele['text']) > 0:
-                            ele['uiaSelector'] = 'new UiSelector().className(\"{}\").textContains(\"{}\")'.format(
-                                ele['class'], ele['text'])
-
-            print("Get all elements done ", len(self.elements))
-        except Exception as e:
-            print(e)
-            print(traceback.format_exc())
+            # Parse all nodes in one pass, selectors are generated on demand, reuse cached result of same dump
+            if isinstance(uix, bytes):
+                self.nodes, self.spatial = self.cache.load(uix)
+                self.dump_source = None
+            else:
+                # Large files are streamed, never read whole, and keep long values (WebView text, ...) on disk
+                lean = self.lean or os.path.getsize(uix) > LEAN_BYTES
+                self.nodes, self.spatial = self.cache.load_file(uix, LEAN_VALUE if lean else None)
+                self.dump_source = uix
+            with tracer.span('search.index'):
+                self.search_index = SearchIndex(self.nodes)  # Search box only looks up words from here on
+
+            tracer.count('nodes', len(self.nodes))
+        except Exception:
+            self.clear_nodes()  # Nodes of the previous dump do not belong to the new screenshot
+            raise
         self.get_nodes()
 
+    def clear_nodes(self):
+        """Show no nodes, marks or properties"""
+        self.nodes = self.spatial = self.search_index = self.search_found = None
+        self.dump_source = None
+        self.focus_index = None
+        self.tree_model = None
+        self.tree.setModel(None)
+        self.props.setModel(None)
+        self.mark.setVisible(False)
+        self.hits.setVisible(False)
+
     def get_point_info(self, x, y):
         """Get element index according to clicked point location"""
-        i = 0
-        self.focus_index = -1
-        s = self.pic_h * self.pic_w
-        found_index = None
-        for item in self.elements:
-            bounds = item['bounds']
-            left = int(bounds[bounds.find("[") + 1:bounds.find(",")])
-            top = int(bounds[bounds.find(",") + 1:bounds.find("][")])
-            right = int(bounds[bounds.find("][") + 2:bounds.find(",", bounds.find("]["))])
-            bottom = int(bounds[bounds.find(",", bounds.find("]["))+1:bounds.find("]", bounds.find("][") + 3)])
-            # Check whether clicked point is internal point of element
-            if left <= x <= right and top <= y <= bottom:
-                new_s = (right - left) * (bottom - top)  # Area
-                if new_s <= s:  # Check whether minimum area
-                    s = new_s
-                    found_index = i
-                    self.focus_index = i
-            i += 1
-        # print("found:",found_index)
+        # Smallest element containing the point, not larger than the screenshot
+        with tracer.span('hit-test'):
+            found_index = self.spatial.find(x, y, self.pic_h * self.pic_w)
+        self.focus_index = found_index if found_index is not None else -1
         self.draw_rect(found_index)
         self.setItemSelected(found_index)
 
     def draw_rect(self,i):
         """Draw rectangle by element index"""
-        print('Draw found item ', i)
-        if i is not None:
-            self.mark.setVisible(True)
-        else:
-            # print('Not found item')
+        if i is None:
+            return
+        self.update_mark(i)
+        # Set table widget layout
+        self.props.horizontalHeader().setStretchLastSection(True)
+        self.get_props(i)
+
+    @tracer.traced('render.mark')
+    def update_mark(self, i):
+        """Place rectangle of element index over the displayed screenshot"""
+        if i is None or i < 0 or self.load_first_time:
             return
-        # print(self.elements)
-        # print(self.elements[i]['bounds'])
-        bounds = self.elements[i]['bounds']
-        left = int(bounds[bounds.find("[") + 1:bounds.find(",")])-2
-        top = int(bounds[bounds.find(",") + 1:bounds.find("][")])-2
-        right = int(bounds[bounds.find("][") + 2:bounds.find(",", bounds.find("]["))])+2
-        bottom = int(bounds[bounds.find(",", bounds.find("][")) + 1:bounds.find("]", bounds.find("][") + 3)])+2
+        self.mark.setVisible(True)
+        left, top, right, bottom = self.nodes.rect(i)
+        left, top, right, bottom = left - 2, top - 2, right + 2, bottom + 2
         if left < 0:
             left = 0
         if top < 0:
@@ -581,25 +1193,28 @@ class myApp(QMainWindow):
             bottom = self.pic_h
         # print(left,right,top,bottom)
         self.mark.setFrameShape(QFrame.Box)
-        self.mark.setGeometry(left / self.rate, top / self.rate, right / self.rate - left / self.rate, bottom / self.rate - top / self.rate)
+        self.mark.setGeometry(int(left / self.rate), int(top / self.rate), int(right / self.rate - left / self.rate),
+                              int(bottom / self.rate - top / self.rate))
         self.mark.setLineWidth(2)
         self.mark.setStyleSheet('color: rgb(255, 0, 0)')
         self.mark.show()
         self.mark.update()
-        # Set table widget layout
-        self.props.horizontalHeader().setStretchLastSection(True)
-        self.get_props(i)
 
     def setItemSelected(self,i):
         """Set item selected by index"""
         if i is not None:
-            self.tree.setCurrentItem(self.item_list[i])
+            index = self.tree_model.node_index(i)
+            self.tree.setCurrentIndex(index)
+            self.tree.scrollTo(index)
 
 
+    @tracer.traced('props')
     def get_props(self,i):
         """Get element properties by element index and display in table widget"""
-        ele = self.elements[i]
-        print(ele)
+        with tracer.span('selectors'):
+            ele = self.nodes.node(i)
+        with tracer.span('locators'):
+            ele['matches'] = self.locator_matches(i, ele)
         self.prolist = []
         for item in ele:
             self.prolist.append(item)
@@ -618,259 +1233,106 @@ class myApp(QMainWindow):
                     self.model.setItem(row, column, item)
         self.props.setModel(self.model)
         for k in range(len(self.prolist)):
-	    if k != len(self.prolist) - 3:
+            if self.prolist[k] != 'fullIndexXpath':
                 self.props.setRowHeight(k, 3)
-	    else:
-		self.props.setRowHeight(k, 50)
+            else:
+                self.props.setRowHeight(k, 50)
         self.props.update()
 
 
+    def copy_props(self):
+        """Copy values of the selected property rows, one per line"""
+        if self.props.model() is None:
+            return
+        rows = sorted(set(index.row() for index in self.props.selectedIndexes()))
+        values = [self.props.model().index(row, 1).data() or "" for row in rows]
+        if values:
+            copy_text("\n".join(values))
+
+    def locator_matches(self, i, ele):
+        """How many nodes each locator of node finds, with ! if node is not the first one"""
+        if self.query_engine is None or self.query_engine.nodes is not self.nodes:
+            self.query_engine = QueryEngine(self.nodes)
+        matches = []
+        for name in ('indicator', 'uiaSelector', 'xpath', 'fullIndexXpath'):
+            if not ele[name]:
+                continue
+            try:
+                found = self.query_engine.select(ele[name])
+                matches.append("{} {}{}".format(name, len(found), "" if found and found[0] == i else "!"))
+            except ValueError:
+                matches.append(name + " ?")
+        return ", ".join(matches)
+
+    @tracer.traced('tree')
     def get_nodes(self):
         """Get nodes information"""
-        if self.tree.topLevelItemCount() > 0:
-            self.tree.clearSelection()
-            self.tree.clear()
-        self.tree.setColumnCount(1)
-        root = QTreeWidgetItem(self.tree)
-        self.eles = []
-        self.item_list = []
-        i = 0
-        self.top = [] # Save top node class
-		self.topn = {} # Save top node index
-        # Get nodes information
-        for line in self.uix.split("\n"):
-            if line.find("<node ") != -1:
-                if line.find("android.widget.TextView") != -1:
-                    sp = ":"
-                else:
-                    sp=" "
-                if line.find("checkable")-line.find("content-desc") > 16:
-                    cd = " {" + self.elements[i]["content-desc"] + "} "
-                else:
-                    cd = ""
-                #  Get node index, node level, node information to display
-                self.eles.append([i, line.find("<node ")/2, "(" + self.elements[i]['index']+") "+ \
-                             self.elements[i]['class'].split("android.widget.")[-1] + sp + self.elements[i]['text'] + \
-                                  cd + " " + self.elements[i]['bounds']])
-                if line.find("<node ")/2 == 1: # Top node				
-                    self.top.append(self.elements[i]['class'])
-                    c = self.top.count(self.elements[i]['class'])
-                    self.topn[str(i)] = str(c) # Add top node index
-                i+=1
-
-        # Add nodes to tree
-        for n in range(len(self.eles)):
-            if self.eles[n][1] == 1:
-                child1 = QTreeWidgetItem(root)
-                child1.setText(0,self.eles[n][2])  # use for item string
-                child1.setText(1,str(n))  # use for item indicator
-                self.item_list.append(child1)
-            elif self.eles[n][1] == 2:
-                child2 = QTreeWidgetItem(child1)
-                child2.setText(0, self.eles[n][2])
-                child2.setText(1, str(n))
-                self.item_list.append(child2)
-            elif self.eles[n][1] == 3:
-                child3 = QTreeWidgetItem(child2)
-                child3.setText(0, self.eles[n][2])
-                child3.setText(1, str(n))
-                self.item_list.append(child3)
-            elif self.eles[n][1] == 4:
-                child4 = QTreeWidgetItem(child3)
-                child4.setText(0, self.eles[n][2])
-                child4.setText(1, str(n))
-                self.item_list.append(child4)
-            elif self.eles[n][1] == 5:
-                child5 = QTreeWidgetItem(child4)
-                child5.setText(0, self.eles[n][2])
-                child5.setText(1, str(n))
-                self.item_list.append(child5)
-            elif self.eles[n][1] == 6:
-                child6 = QTreeWidgetItem(child5)
-                child6.setText(0, self.eles[n][2])
-                child6.setText(1, str(n))
-                self.item_list.append(child6)
-            elif self.eles[n][1] == 7:
-                child7 = QTreeWidgetItem(child6)
-                child7.setText(0, self.eles[n][2])
-                child7.setText(1, str(n))
-                self.item_list.append(child7)
-            elif self.eles[n][1] == 8:
-                child8 = QTreeWidgetItem(child7)
-                child8.setText(0, self.eles[n][2])
-                child8.setText(1, str(n))
-                self.item_list.append(child8)
-            elif self.eles[n][1] == 9:
-                child9 = QTreeWidgetItem(child8)
-                child9.setText(0, self.eles[n][2])
-                child9.setText(1, str(n))
-                self.item_list.append(child9)
-            elif self.eles[n][1] == 10:
-                child10 = QTreeWidgetItem(child9)
-                child10.setText(0, self.eles[n][2])
-                child10.setText(1, str(n))
-                self.item_list.append(child10)
-            elif self.eles[n][1] == 11:
-                child11 = QTreeWidgetItem(child10)
-                child11.setText(0, self.eles[n][2])
-                child11.setText(1, str(n))
-                self.item_list.append(child11)
-            elif self.eles[n][1] == 12:
-                child12 = QTreeWidgetItem(child11)
-                child12.setText(0, self.eles[n][2])
-                child12.setText(1, str(n))
-                self.item_list.append(child12)
-            elif self.eles[n][1] == 13:
-                child13 = QTreeWidgetItem(child12)
-                child13.setText(0, self.eles[n][2])
-                child13.setText(1, str(n))
-                self.item_list.append(child13)
-            elif self.eles[n][1] == 14:
-                child14 = QTreeWidgetItem(child13)
-                child14.setText(0, self.eles[n][2])
-                child14.setText(1, str(n))
-                self.item_list.append(child14)
-            elif self.eles[n][1] == 15:
-                child15 = QTreeWidgetItem(child14)
-                child15.setText(0, self.eles[n][2])
-                child15.setText(1, str(n))
-                self.item_list.append(child15)
-            elif self.eles[n][1] == 16:
-                child16 = QTreeWidgetItem(child15)
-                child16.setText(0, self.eles[n][2])
-                child16.setText(1, str(n))
-                self.item_list.append(child16)
-            elif self.eles[n][1] == 17:
-                child17 = QTreeWidgetItem(child16)
-                child17.setText(0, self.eles[n][2])
-                child17.setText(1, str(n))
-                self.item_list.append(child17)
-            elif self.eles[n][1] == 18:
-                child18 = QTreeWidgetItem(child17)
-                child18.setText(0, self.eles[n][2])
-                child18.setText(1, str(n))
-                self.item_list.append(child18)
-            elif self.eles[n][1] == 19:
-                child19 = QTreeWidgetItem(child18)
-                child19.setText(0, self.eles[n][2])
-                child19.setText(1, str(n))
-                self.item_list.append(child19)
-            elif self.eles[n][1] == 20:
-                child20 = QTreeWidgetItem(child19)
-                child20.setText(0, self.eles[n][2])
-                child20.setText(1, str(n))
-                self.item_list.append(child20)
-            elif self.eles[n][1] == 21:
-                child21 = QTreeWidgetItem(child20)
-                child21.setText(0, self.eles[n][2])
-                child21.setText(1, str(n))
-                self.item_list.append(child21)
-            elif self.eles[n][1] == 22:
-                child22 = QTreeWidgetItem(child21)
-                child22.setText(0, self.eles[n][2])
-                child22.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 23:
-                child23 = QTreeWidgetItem(child22)
-                child23.setText(0, self.eles[n][2])
-                child23.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 24:
-                child24 = QTreeWidgetItem(child23)
-                child24.setText(0, self.eles[n][2])
-                child24.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 25:
-                child25 = QTreeWidgetItem(child24)
-                child25.setText(0, self.eles[n][2])
-                child25.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 26:
-                child26 = QTreeWidgetItem(child25)
-                child26.setText(0, self.eles[n][2])
-                child26.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 27:
-                child27 = QTreeWidgetItem(child26)
-                child27.setText(0, self.eles[n][2])
-                child27.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 28:
-                child28 = QTreeWidgetItem(child27)
-                child28.setText(0, self.eles[n][2])
-                child28.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 29:
-                child29 = QTreeWidgetItem(child28)
-                child29.setText(0, self.eles[n][2])
-                child29.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 30:
-                child30 = QTreeWidgetItem(child29)
-                child30.setText(0, self.eles[n][2])
-                child30.setText(1, str(n))
-                self.item_list.append(child22)
-            elif self.eles[n][1] == 31:
-                child31 = QTreeWidgetItem(child30)
-                child31.setText(0, self.eles[n][2])
-                child31.setText(1, str(n))
-                self.item_list.append(child22)
-
+        self.tree_model = NodeTreeModel(self.nodes)  # Rows are created when branch is expanded
+        self.tree.setModel(self.tree_model)
+        self.search_found = None
+        if self.searchBox.text():
+            self.search_done()
         self.tree.show()
-        self.tree.itemClicked.connect(self.itemClick)
         self.tree.update()
 
-        # Get fullIndexXpath
-        for i in range(len(self.item_list)):
-            item = self.item_list[i]
-            # print(item.text(1),item.text(0))
-            xp = []
-            idx = []
-            while (item is not None):
-                xp.append(item.text(1))
-                idx.append(item.text(0))
-                item = item.parent()
-
-            self.elements[i]['fullIndexXpath'] = "/"
-            xp.pop()
-            idx.pop()
-            # print(xp,idx)
-            j = int(xp[0])
-            k = int(xp.pop())
-            v = self.topn[str(k)]  # Get the top node index
-            self.elements[j]['fullIndexXpath'] = self.elements[j]['fullIndexXpath'] + "/" + self.elements[k]['class'] + "[" + v + "]"
-            while (len(xp) > 0):
-                k = int(xp.pop())
-                # print(k)
-                x = idx.pop()
-                v = x[1:x.find(")")]
-                v = int(v) + 1
-                self.elements[j]['fullIndexXpath'] = self.elements[j]['fullIndexXpath'] + "/" + self.elements[k]['class'] + "[" + str(v) + "]"
-
-
-    def itemClick(self, item):
-        """Table Widget item click event"""
-        if item not in self.item_list:
-            return  # root item
-	
-	i = int(item.text(1))
+    @tracer.traced('search')
+    def search_done(self):
+        """Filter tree to nodes matching the words of search box and mark them on the screenshot"""
+        if self.nodes is None or self.load_first_time:
+            return
+        if self.search_index is None or self.search_index.nodes is not self.nodes:
+            with tracer.span('search.index'):
+                self.search_index = SearchIndex(self.nodes)
+        found = self.search_index.search(self.searchBox.text())
+        if found != self.search_found:
+            self.search_found = found
+            self.tree_model.set_filter(found)
+            if found is not None and len(self.tree_model.rows) <= SEARCH_EXPAND:
+                self.tree.expandAll()
+            if self.focus_index is not None and self.focus_index >= 0:
+                self.setItemSelected(self.focus_index)
+        self.searchInfo.setText("{} found".format(len(found)) if found is not None else "")
+        self.paint_hits()
+
+    @tracer.traced('render.search')
+    def paint_hits(self):
+        """Mark search matches over the displayed screenshot"""
+        if not self.search_found or self.load_first_time:
+            self.hits.setVisible(False)
+            return
+        w, h = max(int(self.w), 1), max(int(self.h), 1)
+        pic = QPixmap(w, h)
+        pic.fill(Qt.transparent)
+        painter = QPainter(pic)
+        painter.setPen(QPen(QColor(255, 160, 0), 1))
+        rect = self.nodes.rect
+        for i in self.search_found[:SEARCH_MARKS]:
+            left, top, right, bottom = rect(i)
+            painter.drawRect(int(left / self.rate), int(top / self.rate), int((right - left) / self.rate),
+                             int((bottom - top) / self.rate))
+        painter.end()
+        self.hits.setPixmap(pic)
+        self.hits.setGeometry(0, 0, w, h)
+        self.hits.setVisible(True)
+
+    def itemClick(self, index):
+        """Tree view item click event"""
+        i = index.internalId()
         # print("index ", i)
-        # print("text ", item.text(0))
         self.focus_index = i
         self.draw_rect(i)
 
     def pre_node(self):
         """Switch to previous node/element"""
         try:
-            print('Previous node')
-            if self.load_first_time:
+            if self.load_first_time or self.nodes is None:
                 return
             if self.focus_index is None:
                 self.focus_index = 1
 
             self.focus_index = self.focus_index - 1
             if self.focus_index < 0:
-                self.focus_index = len(self.elements) - 1
+                self.focus_index = len(self.nodes) - 1
 
             i = self.focus_index
             self.draw_rect(i)
@@ -882,13 +1344,12 @@ class myApp(QMainWindow):
     def next_node(self):
         """Switch to next node/element"""
         try:
-            print('Next node')
-            if self.load_first_time:
+            if self.load_first_time or self.nodes is None:
                 return
             if self.focus_index is None:
                 self.focus_index = -1
             self.focus_index = self.focus_index + 1
-            if self.focus_index >= len(self.elements):
+            if self.focus_index >= len(self.nodes):
                 self.focus_index = 0
             i = self.focus_index
             self.draw_rect(i)
@@ -897,38 +1358,40 @@ class myApp(QMainWindow):
             print(e)
             print(traceback.format_exc())
 
-    def uix_update(self, uix='ui.uix'):
-        """Update uiautomator dump file, add enter and necessary spaces"""
-        with open(uix, 'r', encoding='utf-8') as f:
-            xml = f.readlines()
-        if len(xml) < 3: # only one or two lines, if use 'adb shell uiautomator dump /sdcard/ui.uix' then pull in ui.uix, need check uix
-            x = xml[0].replace(">", ">\n")
-            os.remove(uix)
-            with open(uix, 'w', encoding='utf-8') as f:
-                f.write(x)
-            with open(uix, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            with open(uix, 'w', encoding='utf-8') as f:
-                i = 0
-                s = False
-                for line in lines:
-                    if line.find("<node") != -1:
-                        if s:
-                            line = " " * i + line
-                            s = False
-                        else:
-                            i = i + 2
-                            line = " " * i + line
-                        if line[-3:-2] == "/":
-                            s = True
-                    if line.find("</node>") != -1:
-                        i = i - 2
-                        line = " " * i + line
-                    f.write(line + "\n")
+def main():
+    """Start the window, opening the uiautomator dump given on command line"""
+    app = QApplication(sys.argv)  # Takes Qt options out of sys.argv
+    ap = argparse.ArgumentParser(description="Android Uiautomator Viewer like inspector")
+    ap.add_argument('dump', nargs='?', help="uiautomator dump (.uix/.xml) or bundle (" + BUNDLE_EXT + ") to open")
+    ap.add_argument('screenshot', nargs='?', help="its screenshot, by default the image file of the same name")
+    ap.add_argument('--lean', action='store_true',
+                    help="keep property values longer than {} characters in the dump file".format(LEAN_VALUE))
+    ap.add_argument('--startup', action='store_true',
+                    help="print startup timings as JSON and quit once the dump is shown")
+    args = ap.parse_args(sys.argv[1:])
+    imported = time.perf_counter()
+    demo = myApp()
+    demo.lean = args.lean
+    demo.show()
+    app.processEvents()
+    shown = time.perf_counter()
+    if args.dump:
+        png = args.screenshot or find_screenshot(args.dump)
+        if png is None and not is_bundle(args.dump):
+            ap.error("no screenshot found next to " + args.dump)
+        demo.open_dump(args.dump, png)
+        app.processEvents()
+    if args.startup:
+        loaded = time.perf_counter()
+        print(json.dumps({'imports_ms': round((imported - STARTED) * 1000, 1),
+                          'window_ms': round((shown - imported) * 1000, 1),
+                          'load_ms': round((loaded - shown) * 1000, 1),
+                          'total_ms': round((loaded - STARTED) * 1000, 1),
+                          'nodes': len(demo.nodes) if demo.nodes is not None else 0,
+                          'not_imported': [name for name in ('uiautomator2', 'pyperclip') if name not in sys.modules]}))
+        return 0
+    return app.exec_()
+
 
 if __name__ == '__main__':
-    app=QApplication(sys.argv)
-    demo=myApp()
-    demo.show()
-    sys.exit(app.exec_())
+    sys.exit(main())
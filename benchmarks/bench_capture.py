@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# File: bench_capture.py
+# Environment: Python3.6
+# Description: Compare decoding PNG and raw framebuffer screenshots, on recorded frames, no device needed
+#
+# Record raw frames with:  adb exec-out screencap > frame.raw
+# PNG files are converted to RGBA_8888 raw frames, raw frames are encoded to PNG, so both paths decode the same pixels.
+
+import sys, os, time, json, struct, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QApplication
+
+from UiautomatorHelper import screenshot_pixmap
+
+
+def raw_frame(image):
+    """screencap raw frame (Android 9+ header) from QImage"""
+    image = image.convertToFormat(QImage.Format_RGBA8888)
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    return struct.pack('<4I', image.width(), image.height(), 1, 0) + bytes(bits)
+
+
+def png_bytes(image):
+    """PNG bytes of QImage"""
+    data = QByteArray()
+    buf = QBuffer(data)
+    buf.open(QIODevice.WriteOnly)
+    image.save(buf, 'PNG')
+    return bytes(data)
+
+
+def best_time(func, repeat):
+    """Best wall time of repeat calls in ms"""
+    best = None
+    for n in range(repeat):
+        start = time.perf_counter()
+        func()
+        took = (time.perf_counter() - start) * 1000
+        best = took if best is None else min(best, took)
+    return best
+
+
+def bench(path, repeat, mbps):
+    """Decode times and sizes for one recorded frame"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data.startswith(b'\x89PNG'):
+        png = data
+        raw = raw_frame(screenshot_pixmap(png).toImage())
+    else:
+        raw = data
+        png = png_bytes(screenshot_pixmap(raw).toImage())
+    pic = screenshot_pixmap(raw)
+    result = {'file': path, 'width': pic.width(), 'height': pic.height(),
+              'png_bytes': len(png), 'raw_bytes': len(raw),
+              'png_decode_ms': round(best_time(lambda: screenshot_pixmap(png), repeat), 2),
+              'raw_decode_ms': round(best_time(lambda: screenshot_pixmap(raw), repeat), 2)}
+    if mbps:
+        # Transfer estimate for the given adb throughput, on device PNG encoding comes on top of the PNG path
+        result['png_transfer_ms'] = round(len(png) / (mbps * 1e6) * 1000, 2)
+        result['raw_transfer_ms'] = round(len(raw) / (mbps * 1e6) * 1000, 2)
+    return result
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark PNG against raw framebuffer screenshot decoding")
+    ap.add_argument('frames', nargs='+', help="recorded raw frames or PNG screenshots")
+    ap.add_argument('-n', '--repeat', type=int, default=10, help="decodes per frame, best time is reported")
+    ap.add_argument('--mbps', type=float, default=0, help="adb throughput in MB/s, to estimate transfer times")
+    args = ap.parse_args(argv)
+
+    app = QApplication(sys.argv[:1])
+    for path in args.frames:
+        print(json.dumps(bench(path, args.repeat, args.mbps)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# File: bench_stages.py
+# Environment: Python3.6
+# Description: Time each stage of loading and browsing a dump on synthetic dumps, headless, as JSON Lines
+#
+# One JSON line per dump size and stage, with the best time of the repeats, for example:
+#   python benchmarks/bench_stages.py --sizes 100,1000,10000,100000 > stages.jsonl
+
+import sys, os, time, json, random, shutil, tempfile, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtGui import QPixmap, QColor
+from PyQt5.QtWidgets import QApplication
+
+from uix_engine import parse_uix, format_uix
+from uix_cache import DumpCache
+from uix_query import SearchIndex
+from uix_synth import synthetic_uix
+from UiautomatorHelper import myApp
+
+WIDTH, HEIGHT = 1080, 2340  # Screen of the synthetic dumps
+STAGES = ('format_uix', 'parse_uix', 'get_all_elements', 'get_all_elements_cached', 'selectors', 'get_nodes',
+          'expand_all', 'full_index_xpath', 'search_index', 'spatial_find', 'get_point_info', 'draw_rect')
+
+
+def best_time(func, repeat, setup=None):
+    """Best wall time of repeat calls in ms, setup runs untimed before every call"""
+    best = None
+    for n in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        took = (time.perf_counter() - start) * 1000
+        best = took if best is None else min(best, took)
+    return best
+
+
+def stages(app, data, points, picks, tmp):
+    """(stage name, function, calls per run, setup) in run order, on the loaded app with its cache in tmp"""
+
+    def cold_cache():
+        shutil.rmtree(tmp, ignore_errors=True)
+        app.cache = DumpCache(tmp)
+
+    def all_nodes(func):
+        return lambda: [func(i) for i in range(len(app.nodes))]
+
+    def find():
+        for x, y in points:
+            app.spatial.find(x, y, WIDTH * HEIGHT)
+
+    def hit_test():
+        for x, y in points:
+            app.get_point_info(x, y)
+
+    def draw():
+        for i in picks:
+            app.draw_rect(i)
+
+    def reset_tree():
+        app.get_nodes()
+
+    return [
+        ('format_uix', lambda: format_uix(data), 1, None),  # Saved dump formatting, see save_files()
+        ('parse_uix', lambda: parse_uix(data), 1, None),
+        ('get_all_elements', lambda: app.get_all_elements(data), 1, cold_cache),  # Parse and write cache
+        ('get_all_elements_cached', lambda: app.get_all_elements(data), 1, None),  # Load from cache
+        ('selectors', lambda: all_nodes(app.nodes.selectors)(), None, None),
+        ('get_nodes', app.get_nodes, 1, None),
+        ('expand_all', app.tree.expandAll, 1, reset_tree),
+        ('full_index_xpath', lambda: all_nodes(app.nodes.full_index_xpath)(), None, None),
+        ('search_index', lambda: SearchIndex(app.nodes), 1, None),
+        ('spatial_find', find, len(points), None),  # Hit-test only
+        ('get_point_info', hit_test, len(points), None),  # Hit-test, mark and props panel
+        ('draw_rect', draw, len(picks), None),
+    ]
+
+
+def bench(app, size, args, wanted):
+    """Timings of the wanted stages for one synthetic dump"""
+    data = synthetic_uix(size, args.depth, args.fanout, args.dup, args.seed)
+    rnd = random.Random(args.seed)
+    points = [(rnd.randrange(WIDTH), rnd.randrange(HEIGHT)) for _ in range(args.points)]
+    picks = [rnd.randrange(size) for _ in range(min(args.picks, size))]
+    shape = {'nodes': size, 'depth': args.depth, 'fanout': args.fanout, 'dup': args.dup, 'bytes': len(data)}
+    tmp = tempfile.mkdtemp(prefix='bench_stages_')
+    try:
+        app.cache = DumpCache(tmp)  # Keep the user cache out of it
+        app.get_all_elements(data)  # Stages after get_all_elements need a loaded dump
+        for name, func, calls, setup in stages(app, data, points, picks, tmp):
+            if name not in wanted:
+                continue
+            calls = calls if calls is not None else size
+            ms = best_time(func, args.repeat, setup)
+            yield dict(shape, stage=name, ms=round(ms, 3), calls=calls,
+                       us_per_call=round(ms * 1000 / calls, 3) if calls else None)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Time dump loading and browsing stages on synthetic dumps")
+    ap.add_argument('--sizes', default='100,1000,10000', help="comma separated node counts")
+    ap.add_argument('--depth', type=int, default=25, help="maximum nesting depth of the synthetic dumps")
+    ap.add_argument('--fanout', type=int, default=8, help="maximum children per node")
+    ap.add_argument('--dup', type=float, default=0.7, help="share of values drawn from a shared pool, 0 to 1")
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('-n', '--repeat', type=int, default=3, help="runs per stage, best time is reported")
+    ap.add_argument('--points', type=int, default=1000, help="hit-tests per get_point_info run")
+    ap.add_argument('--picks', type=int, default=100, help="nodes per draw_rect run")
+    ap.add_argument('--stages', default=','.join(STAGES), help="comma separated stages to run")
+    args = ap.parse_args(argv)
+    wanted = set(args.stages.split(','))
+    unknown = wanted - set(STAGES)
+    if unknown:
+        ap.error("unknown stages: " + ", ".join(sorted(unknown)))
+
+    qapp = QApplication(sys.argv[:1])
+    app = myApp()
+    app.resize(700, 500)
+    app.show()
+    pic = QPixmap(WIDTH, HEIGHT)
+    pic.fill(QColor(240, 240, 240))
+    app.load_first_time = False
+    app.set_screenshot(pic)
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for result in bench(app, size, args, wanted):
+            print(json.dumps(result))
+            sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# File: bench_startup.py
+# Environment: Python3.6
+# Description: Measure startup straight into a dump given on the command line, and check it against a budget
+#
+# Starts UiautomatorHelper.py --startup in a new process per run (offscreen Qt) with an empty dump cache, one
+# JSON line per run and a summary line with the best times. Exit status is 1 when the best total is over the
+# budget, for CI.
+
+import sys, os, json, time, shutil, argparse, tempfile, subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from uix_synth import synthetic_uix
+
+
+def run(dump, screenshot):
+    """Startup timings of one process with an empty dump cache, wall_ms includes interpreter start"""
+    cache = tempfile.mkdtemp(prefix='bench_startup_')  # Cold start every run, and keep the user cache out of it
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'),
+               UIAUTOMATORHELPER_CACHE=cache)
+    try:
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, os.path.join(ROOT, 'UiautomatorHelper.py'), dump, screenshot,
+                              '--startup'], cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             check=True).stdout
+        wall = (time.perf_counter() - start) * 1000
+    finally:
+        shutil.rmtree(cache, ignore_errors=True)
+    result = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+    result['wall_ms'] = round(wall, 1)
+    return result
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Startup time of opening a dump from the command line")
+    ap.add_argument('dump', nargs='?', help="dump to open, a synthetic one of --nodes nodes by default")
+    ap.add_argument('--screenshot', default=os.path.join(ROOT, 'dump.png'), help="screenshot to open with it")
+    ap.add_argument('--nodes', type=int, default=1000, help="nodes of the synthetic dump")
+    ap.add_argument('-n', '--repeat', type=int, default=5, help="process starts, best times are compared")
+    ap.add_argument('--budget-ms', type=float, default=1500, help="budget for the best wall time")
+    args = ap.parse_args(argv)
+
+    dump = args.dump
+    tmp = None
+    if dump is None:
+        fd, tmp = tempfile.mkstemp(suffix='.uix')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(synthetic_uix(args.nodes))
+        dump = tmp
+    try:
+        results = []
+        for n in range(args.repeat):
+            results.append(run(dump, args.screenshot))
+            print(json.dumps(results[-1]))
+    finally:
+        if tmp is not None:
+            os.remove(tmp)
+    best = dict((key, min(r[key] for r in results)) for key in ('imports_ms', 'window_ms', 'load_ms', 'total_ms', 'wall_ms'))
+    best.update(nodes=results[-1]['nodes'], not_imported=results[-1]['not_imported'], budget_ms=args.budget_ms,
+                within_budget=best['wall_ms'] <= args.budget_ms, summary=True)
+    print(json.dumps(best))
+    return 0 if best['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
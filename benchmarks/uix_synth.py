@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# File: uix_synth.py
+# Environment: Python3.6
+# Description: Generate synthetic uiautomator dumps of any size and shape, for benchmarks
+#
+# Shape: nodes in total, maximum depth, maximum children per node. Duplication is the share of text,
+# resource-id and content-desc values drawn from a small pool shared by all nodes, like list items of real
+# screens; the other values are unique. The same arguments and seed give the same dump.
+
+import sys, random, argparse
+
+CLASSES = ('android.widget.FrameLayout', 'android.widget.LinearLayout', 'android.widget.TextView',
+           'android.widget.ImageView', 'android.widget.Button', 'android.view.ViewGroup',
+           'androidx.recyclerview.widget.RecyclerView', 'android.widget.EditText', 'android.widget.CheckBox')
+FLAGS = ('checkable', 'checked', 'clickable', 'enabled', 'focusable', 'focused', 'scrollable', 'long-clickable',
+         'password', 'selected')
+SHARED = 32  # Values in the shared pool of each property
+
+
+def capacity(depth, fanout, max_depth):
+    """Most nodes a subtree rooted at depth can hold"""
+    total, level = 0, 1
+    for d in range(depth, max_depth + 1):
+        total += level
+        level *= fanout
+        if total > 1 << 40:
+            break
+    return total
+
+
+def split(rnd, budget, parts, cap):
+    """Random sizes of parts subtrees adding up to budget, none over cap"""
+    cuts = sorted(rnd.randint(0, budget - parts) for _ in range(parts - 1))
+    sizes = [b - a + 1 for a, b in zip([0] + cuts, cuts + [budget - parts])]
+    over = 0
+    for k, size in enumerate(sizes):
+        if size > cap:
+            over += size - cap
+            sizes[k] = cap
+    for k, size in enumerate(sizes):  # Hand the excess to subtrees with room
+        if not over:
+            break
+        room = min(cap - size, over)
+        sizes[k] += room
+        over -= room
+    return sizes
+
+
+def synthetic_uix(nodes=1000, depth=20, fanout=6, dup=0.7, seed=1, width=1080, height=2340):
+    """uiautomator dump as UTF-8 bytes, one node per line indented by nesting like saved dumps"""
+    if nodes < 1 or depth < 1 or fanout < 1:
+        raise ValueError("Need at least one node, depth and fan-out of at least 1")
+    if nodes > capacity(1, fanout, depth):
+        raise ValueError("{} nodes do not fit in depth {} with fan-out {}".format(nodes, depth, fanout))
+    rnd = random.Random(seed)
+    pools = dict((key, [fmt.format(k) for k in range(SHARED)]) for key, fmt in
+                 (('text', 'Item {}'), ('resource-id', 'com.example:id/item_{}'), ('content-desc', 'Action {}')))
+    unique = {'text': 'Text {}', 'resource-id': 'com.example:id/view_{}', 'content-desc': 'Description {}'}
+    out = ["<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>", '<hierarchy rotation="0">']
+    count = [0]
+
+    def value(key):
+        r = rnd.random()
+        if r < 0.4:
+            return ''  # Most nodes have no text or id
+        if r < 0.4 + 0.6 * dup:
+            return rnd.choice(pools[key])
+        return unique[key].format(count[0])
+
+    def node(level, index, budget, box):
+        count[0] += 1
+        left, top, right, bottom = box
+        attrs = [('index', str(index)), ('text', value('text')), ('resource-id', value('resource-id')),
+                 ('class', rnd.choice(CLASSES)), ('package', 'com.example'),
+                 ('content-desc', value('content-desc'))]
+        attrs += [(flag, 'true' if rnd.random() < 0.2 else 'false') for flag in FLAGS]
+        attrs.append(('bounds', '[{},{}][{},{}]'.format(left, top, right, bottom)))
+        line = '  ' * level + '<node ' + ' '.join('{}="{}"'.format(k, v) for k, v in attrs)  # Values need no escaping
+        if budget == 1:
+            out.append(line + ' />')
+            return
+        out.append(line + '>')
+        cap = capacity(level + 1, fanout, depth)
+        parts = rnd.randint(max(1, -(-(budget - 1) // cap)), min(fanout, budget - 1))
+        sizes = split(rnd, budget - 1, parts, cap)
+        for k, size in enumerate(sizes):
+            # Children split the parent box, rows and columns by turns
+            if level % 2:
+                step = max(1, (bottom - top) // parts)
+                child = (left, min(top + k * step, bottom), right, min(top + (k + 1) * step, bottom))
+            else:
+                step = max(1, (right - left) // parts)
+                child = (min(left + k * step, right), top, min(left + (k + 1) * step, right), bottom)
+            node(level + 1, k, size, child)
+        out.append('  ' * level + '</node>')
+
+    node(1, 0, nodes, (0, 0, width, height))
+    out.append('</hierarchy>')
+    return ('\n'.join(out) + '\n').encode('utf-8')
+
+
+def main(argv=None):
+    """Command line: write a synthetic dump"""
+    ap = argparse.ArgumentParser(description="Generate a synthetic uiautomator dump")
+    ap.add_argument('output', help="dump file to write, - for stdout")
+    ap.add_argument('-n', '--nodes', type=int, default=1000, help="number of nodes")
+    ap.add_argument('--depth', type=int, default=20, help="maximum nesting depth")
+    ap.add_argument('--fanout', type=int, default=6, help="maximum children per node")
+    ap.add_argument('--dup', type=float, default=0.7, help="share of values drawn from a shared pool, 0 to 1")
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args(argv)
+
+    data = synthetic_uix(args.nodes, args.depth, args.fanout, args.dup, args.seed)
+    if args.output == '-':
+        sys.stdout.buffer.write(data)
+    else:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# File: device_capture.py
+# Environment: Python3.6
+# Description: Capture screenshot and uiautomator dump from device into memory, both at the same time, without Qt
+
+import subprocess, threading, time, struct
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from uix_trace import tracer
+
+# screencap raw pixel formats (android PixelFormat) and their bytes per pixel
+RAW_FORMATS = {1: 'RGBA_8888', 2: 'RGBX_8888', 3: 'RGB_888', 4: 'RGB_565', 5: 'BGRA_8888'}
+RAW_BPP = {1: 4, 2: 4, 3: 3, 4: 2, 5: 4}
+
+
+class CaptureCancelled(Exception):
+    """Capture was cancelled by user"""
+
+
+def parse_raw(data):
+    """Parse screencap raw frame, return (width, height, format, pixel offset)
+
+    The header is width, height, format, and on Android 9+ also a color space, all little endian uint32.
+    """
+    if len(data) < 12:
+        raise ValueError("Raw frame too short: {} bytes".format(len(data)))
+    width, height, fmt = struct.unpack_from('<3I', data)
+    if fmt not in RAW_BPP:
+        raise ValueError("Unsupported raw pixel format {}".format(fmt))
+    size = width * height * RAW_BPP[fmt]
+    for offset in (16, 12):
+        if len(data) - offset == size:
+            return width, height, fmt, offset
+    raise ValueError("Raw frame size {} does not match {}x{} {}".format(len(data), width, height, RAW_FORMATS[fmt]))
+
+
+class DeviceSessions(object):
+    """uiautomator2 connections by device serial, health-checked and reconnected when needed"""
+
+    TRUST_SECONDS = 5  # A connection used this recently is reused without health check
+
+    def __init__(self, connect):
+        self.connect = connect  # Function connecting to device by serial, None for the only device
+        self.devices = {}
+        self.last_used = {}
+        self.lock = threading.Lock()
+        self.connects = 0
+
+    def get(self, serial=None):
+        """Connected device for serial, reuse the existing connection if it is alive"""
+        with self.lock:
+            device = self.devices.get(serial)
+            if device is not None:
+                if time.time() - self.last_used.get(serial, 0) < self.TRUST_SECONDS or self.alive(device):
+                    self.last_used[serial] = time.time()
+                    return device
+            device = self.devices[serial] = self.connect(serial)
+            self.connects += 1
+            self.last_used[serial] = time.time()
+            return device
+
+    def used(self, serial=None):
+        """Mark connection as working, so the next get() can skip the health check"""
+        self.last_used[serial] = time.time()
+
+    def drop(self, serial=None):
+        """Forget connection, the next get() reconnects"""
+        with self.lock:
+            self.devices.pop(serial, None)
+            self.last_used.pop(serial, None)
+
+    @staticmethod
+    def alive(device):
+        """Cheap health check: one RPC call to the device"""
+        try:
+            device.info
+            return True
+        except Exception:
+            return False
+
+
+class Capture(object):
+    """One capture of screenshot and uiautomator dump, screenshot and dump run concurrently"""
+
+    def __init__(self, sessions, adb='adb', serial=None, raw=False):
+        self.sessions = sessions
+        self.adb = adb  # adb executable, a script emitting a canned PNG can stand in for tests
+        self.raw = raw  # Raw framebuffer instead of PNG, skips PNG encoding on device but transfers more bytes
+        self.serial = serial
+        self.device = None
+        self.cancelled = threading.Event()
+        self.procs = []
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        """Stop running adb commands, the capture raises CaptureCancelled"""
+        self.cancelled.set()
+        with self.lock:
+            for proc in self.procs:
+                if proc.poll() is None:
+                    proc.kill()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise CaptureCancelled()
+
+    def adb_run(self, *args):
+        """Run adb command, killed if capture is cancelled"""
+        self.check()
+        cmd = (self.adb,) + (('-s', self.serial) if self.serial else ()) + args
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with self.lock:
+            self.procs.append(proc)
+        out, err = proc.communicate()
+        self.check()
+        if proc.returncode != 0:
+            raise RuntimeError("{} failed: {}".format(" ".join(args), err.decode('utf-8', 'replace').strip()))
+        return out
+
+    @tracer.traced('capture.screenshot')
+    def screenshot(self):
+        """Take screenshot on device, PNG bytes are streamed over adb stdout, no file on device or computer"""
+        if self.raw:
+            frame = self.adb_run('exec-out', 'screencap')
+            parse_raw(frame)  # Check header and size
+            return frame
+        png = self.adb_run('exec-out', 'screencap', '-p')
+        if not png.startswith(b'\x89PNG'):
+            raise RuntimeError("screencap returned no PNG: {!r}".format(png[:80]))
+        return png
+
+    @tracer.traced('capture.hierarchy')
+    def hierarchy(self):
+        """Get uiautomator dump xml"""
+        self.check()
+        self.device = self.sessions.get(self.serial)
+        self.check()
+        try:
+            xml = self.device.dump_hierarchy()
+        except Exception:
+            # Connection may be stale, reconnect once
+            self.check()
+            self.sessions.drop(self.serial)
+            self.device = self.sessions.get(self.serial)
+            xml = self.device.dump_hierarchy()
+        self.sessions.used(self.serial)
+        self.check()
+        return xml
+
+    @tracer.traced('capture')
+    def run(self, progress=None):
+        """Capture, return (png or raw frame bytes, xml), progress is called with the name of each finished step"""
+        with ThreadPoolExecutor(2) as pool:
+            steps = {pool.submit(self.screenshot): 'Screenshot', pool.submit(self.hierarchy): 'UI hierarchy'}
+            try:
+                for future in as_completed(steps):
+                    future.result()  # Raise error of step
+                    if progress is not None:
+                        progress(steps[future])
+            except Exception:
+                self.cancel()  # Stop the other step as well
+                raise
+            png, xml = [future.result() for future in steps]
+        return png, xml
+
+
+class ReplayCapture(object):
+    """Saved screenshot and uiautomator dump pairs, returned one per run in place of a device capture"""
+
+    def __init__(self, pairs):
+        self.pairs = [(uix, png) for uix, png in pairs if png is not None]  # (uix path, screenshot path)
+        self.next = 0
+        self.device = None
+
+    def cancel(self):
+        pass
+
+    def run(self, progress=None):
+        """Next pair as (screenshot bytes, xml), starts over after the last one"""
+        if not self.pairs:
+            raise RuntimeError("No screenshot and uiautomator dump pairs to replay")
+        uix, png = self.pairs[self.next % len(self.pairs)]
+        self.next += 1
+        with open(png, 'rb') as f:
+            screenshot = f.read()
+        with open(uix, 'r', encoding='utf-8') as f:
+            xml = f.read()
+        return screenshot, xml
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File: fake_adb.py
+# Environment: Python3.6
+# Description: Stand-in for adb in capture tests, screencap writes a canned 2x2 frame to stdout
+#
+#   fake_adb.py [-s serial] exec-out screencap -p   # PNG
+#   fake_adb.py [-s serial] exec-out screencap      # raw RGBA_8888 frame with Android 9+ header
+# Anything else fails like adb does, with a message on stderr and exit status 1.
+
+import sys, struct, zlib
+
+WIDTH, HEIGHT = 2, 2
+PIXELS = bytes([255, 0, 0, 255, 0, 255, 0, 255, 0, 0, 255, 255, 255, 255, 255, 255])  # RGBA rows
+
+
+def png():
+    """PNG of the canned pixels"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    rows = b''.join(b'\0' + PIXELS[y * WIDTH * 4:(y + 1) * WIDTH * 4] for y in range(HEIGHT))
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', WIDTH, HEIGHT, 8, 6, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+def raw():
+    """screencap raw frame of the canned pixels: width, height, format, color space, pixels"""
+    return struct.pack('<4I', WIDTH, HEIGHT, 1, 1) + PIXELS
+
+
+def main(args):
+    if args[:1] == ['-s']:
+        args = args[2:]
+    if args == ['exec-out', 'screencap', '-p']:
+        sys.stdout.buffer.write(png())
+    elif args == ['exec-out', 'screencap']:
+        sys.stdout.buffer.write(raw())
+    else:
+        sys.stderr.write("error: unknown command " + " ".join(args) + "\n")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# File: test_batch.py
+# Environment: Python3.6
+# Description: Tests of resuming the SQLite index of saved dumps
+
+import os, sys, sqlite3
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from uix_batch import build_index
+from uix_synth import synthetic_uix
+
+
+def dumps(output):
+    db = sqlite3.connect(output)
+    rows = dict((uix, (count, error is None)) for uix, count, error in
+                db.execute("SELECT uix, node_count, error FROM dumps"))
+    nodes = db.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+    db.close()
+    return rows, nodes
+
+
+def test_resume_reindexes_failed_and_changed_dumps(tmp_path, monkeypatch):
+    root = tmp_path / 'saved'
+    root.mkdir()
+    for k in range(3):
+        (root / 'dump_{}.uix'.format(k)).write_bytes(synthetic_uix(50, 5, 4, 0.5, k))
+    (root / 'dump_bad.uix').write_bytes(b'<hierarchy><node')
+    output = str(tmp_path / 'index.sqlite')
+    monkeypatch.chdir(str(tmp_path))
+    assert build_index('saved', output, jobs=2) == 4
+    rows, nodes = dumps(output)
+    assert sorted(rows) == sorted(str(root / name) for name in os.listdir(str(root)))
+    assert not rows[str(root / 'dump_bad.uix')][1] and nodes == 150
+
+    # Same dumps by another path, only the failed one is tried again
+    assert build_index(str(root) + os.sep, output, jobs=2) == 1
+
+    (root / 'dump_bad.uix').write_bytes(b'<hierarchy><node class="A" bounds="[0,0][1,1]"/></hierarchy>')
+    os.utime(str(root / 'dump_1.uix'), (0, 0))
+    assert build_index('./saved', output, jobs=2) == 2
+    assert build_index('saved', output, jobs=2) == 0
+    rows, nodes = dumps(output)
+    assert len(rows) == 4 and all(ok for count, ok in rows.values())
+    assert rows[str(root / 'dump_bad.uix')] == (1, True) and nodes == 151
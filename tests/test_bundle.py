@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# File: test_bundle.py
+# Environment: Python3.6
+# Description: Tests of single file bundles: round trip with saved pairs, lean values and file handling
+
+import os, sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+import fake_adb
+from uix_engine import parse_uix, format_uix, SpatialIndex
+from uix_bundle import Bundle, write_bundle, pack_pair, unpack_bundle, file_mode, main
+from uix_synth import synthetic_uix
+from test_engine import long_values_dump
+
+
+def save_pair(directory, stem='dump_20190401195100'):
+    """Screenshot and uiautomator dump pair like the Save button writes"""
+    uix, png = os.path.join(directory, stem + '.uix'), os.path.join(directory, stem + '.png')
+    with open(uix, 'w', encoding='utf-8') as f:
+        f.write(format_uix(synthetic_uix(500, 10, 5, 0.7, 7)))
+    with open(png, 'wb') as f:
+        f.write(fake_adb.png())
+    return uix, png
+
+
+def same_nodes(a, b):
+    assert len(a) == len(b) and a.keys == b.keys
+    for i in range(len(a)):
+        assert [a.get(i, key) for key in a.keys] == [b.get(i, key) for key in b.keys]
+        assert (a.parent[i], a.depth[i], a.ordinal[i]) == (b.parent[i], b.depth[i], b.ordinal[i])
+    assert list(a.child_nodes) == list(b.child_nodes)
+    assert [a.selectors(i) for i in range(len(a))] == [b.selectors(i) for i in range(len(b))]
+
+
+def test_round_trip_with_saved_pair(tmp_path):
+    uix, png = save_pair(str(tmp_path))
+    path = pack_pair(uix, png)
+    assert path == os.path.splitext(uix)[0] + '.uixb'
+    parsed = parse_uix(uix)
+    with Bundle(path) as bundle:
+        assert bundle.screenshot() == fake_adb.png()
+        with open(uix, 'rb') as f:
+            assert bundle.hierarchy() == f.read()
+        same_nodes(bundle.nodes(), parsed)
+        spatial, fresh = bundle.spatial(), SpatialIndex(parsed)
+        for x in range(0, 1080, 37):
+            for y in range(0, 2340, 41):
+                assert spatial.find(x, y) == fresh.find(x, y)
+
+    out = tmp_path / 'out'
+    out.mkdir()
+    assert main(['unpack', path, '-d', str(out)]) == 0
+    for name in (uix, png):
+        with open(name, 'rb') as f, open(str(out / os.path.basename(name)), 'rb') as g:
+            assert f.read() == g.read()
+
+
+def test_never_overwrites(tmp_path):
+    uix, png = save_pair(str(tmp_path))
+    path = pack_pair(uix, png)
+    with pytest.raises(FileExistsError):
+        pack_pair(uix, png)
+    with pytest.raises(FileExistsError):
+        unpack_bundle(path)  # The saved pair is next to the bundle
+    with open(png, 'rb') as f:
+        assert f.read() == fake_adb.png()
+
+
+def test_bundle_file_mode(tmp_path):
+    path = write_bundle(str(tmp_path / 'a.uixb'), fake_adb.png(), synthetic_uix(50, 5, 4))
+    assert os.stat(path).st_mode & 0o777 == file_mode()
+
+
+def test_lean_values_read_from_hierarchy_section(tmp_path):
+    path, stripped = str(tmp_path / 'long.uix'), str(tmp_path / 'stripped.uix')
+    long_values_dump(path, stripped)
+    full, lean = parse_uix(path), parse_uix(path, 45)
+    with open(path, 'rb') as f:
+        bundle_path = write_bundle(str(tmp_path / 'long.uixb'), fake_adb.png(), f.read(), lean)
+    os.remove(path)  # Values are read from the copy of the dump in the bundle
+    with Bundle(bundle_path) as bundle:
+        nodes = bundle.nodes()
+        assert nodes.source == (os.path.abspath(bundle_path), bundle.sections['hierarchy'][0])
+    deferred = [i for i in range(len(nodes)) if nodes.is_deferred(i, 'text')]
+    assert deferred
+    for i in range(len(nodes)):
+        for key in ('text', 'content-desc', 'resource-id'):
+            assert nodes.get(i, key) == full.get(i, key)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# File: test_capture.py
+# Environment: Python3.6
+# Description: Tests of device capture against fake_adb.py and a stub uiautomator2 device
+
+import os, sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+
+import pytest
+
+import fake_adb
+from device_capture import Capture, DeviceSessions, parse_raw
+
+FAKE_ADB = os.path.join(HERE, 'fake_adb.py')
+XML = '<hierarchy rotation="0"><node class="A" bounds="[0,0][2,2]" /></hierarchy>'
+
+
+class StubDevice(object):
+    """uiautomator2 device returning a fixed dump, failing the first dumps if asked"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.info = {}
+
+    def dump_hierarchy(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("stale connection")
+        return XML
+
+
+def test_png_capture():
+    sessions = DeviceSessions(lambda serial: StubDevice())
+    steps = []
+    png, xml = Capture(sessions, adb=FAKE_ADB).run(steps.append)
+    assert png == fake_adb.png()
+    assert xml == XML
+    assert sorted(steps) == ['Screenshot', 'UI hierarchy']
+
+
+def test_raw_capture():
+    sessions = DeviceSessions(lambda serial: StubDevice())
+    frame, xml = Capture(sessions, adb=FAKE_ADB, serial='emulator-5554', raw=True).run()
+    assert frame == fake_adb.raw()
+    assert parse_raw(frame) == (fake_adb.WIDTH, fake_adb.HEIGHT, 1, 16)
+    assert xml == XML
+
+
+def test_stale_connection_reconnects_once():
+    devices = [StubDevice(failures=1), StubDevice()]
+    sessions = DeviceSessions(lambda serial: devices.pop(0))
+    png, xml = Capture(sessions, adb=FAKE_ADB).run()
+    assert xml == XML and sessions.connects == 2
+
+
+def test_adb_error():
+    capture = Capture(DeviceSessions(lambda serial: StubDevice()), adb=FAKE_ADB)
+    with pytest.raises(RuntimeError, match="unknown command"):
+        capture.adb_run('shell', 'ls')
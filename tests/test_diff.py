@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# File: test_diff.py
+# Environment: Python3.6
+# Description: Tests of tree diff between two uiautomator dumps
+
+import os, sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from uix_diff import diff_uix
+from uix_synth import synthetic_uix
+
+ZERO = {'inserted': 0, 'removed': 0, 'moved': 0, 'changed': 0}
+
+
+def node(cls, text='', rid='', bounds='[0,0][10,10]', children=''):
+    attrs = 'class="{}" text="{}" resource-id="{}" bounds="{}"'.format(cls, text, rid, bounds)
+    return '<node {}>{}</node>'.format(attrs, children) if children else '<node {} />'.format(attrs)
+
+
+def dump(*nodes):
+    return ('<hierarchy rotation="0">' + ''.join(nodes) + '</hierarchy>').encode('utf-8')
+
+
+A_ = node('Text', 'a', 'id/a', '[0,0][10,10]')
+B_ = node('Text', 'b', 'id/b', '[0,10][10,20]')
+C_ = node('Button', 'c', 'id/c', '[0,20][10,30]')
+BASE = dump(node('Frame', children=A_ + B_ + C_))  # Nodes: Frame 0, a 1, b 2, c 3
+
+
+def counts(diff):
+    summary = diff.summary()
+    return dict((key, summary[key]) for key in ZERO)
+
+
+def ops(diff):
+    return [(r['op'], r['a'], r['b']) for r in diff.records()]
+
+
+def test_identical_dumps():
+    diff = diff_uix(BASE, BASE)
+    assert counts(diff) == ZERO and ops(diff) == []
+    big = synthetic_uix(2000, 12, 6, 0.7, 2)
+    diff = diff_uix(big, big)
+    assert counts(diff) == ZERO and list(diff.match_a) == list(range(2000))
+
+
+def test_sibling_reorder_is_moved():
+    diff = diff_uix(BASE, dump(node('Frame', children=B_ + A_ + C_)))
+    assert counts(diff) == dict(ZERO, moved=1)
+    assert ops(diff) == [('moved', 1, 2)]
+    assert list(diff.match_a) == [0, 2, 1, 3]
+
+
+def test_new_child_is_inserted():
+    diff = diff_uix(BASE, dump(node('Frame', children=A_ + B_ + C_ + node('Image', '', 'id/new', '[0,30][10,40]'))))
+    assert counts(diff) == dict(ZERO, inserted=1)
+    assert ops(diff) == [('inserted', None, 4)]
+
+
+def test_removed_child():
+    diff = diff_uix(BASE, dump(node('Frame', children=A_ + C_)))
+    assert counts(diff) == dict(ZERO, removed=1)
+    assert ops(diff) == [('removed', 2, None)]
+
+
+def test_text_edit_is_changed():
+    diff = diff_uix(BASE, dump(node('Frame', children=A_ + node('Text', 'bee', 'id/b', '[0,10][10,20]') + C_)))
+    assert counts(diff) == dict(ZERO, changed=1)
+    assert ops(diff) == [('changed', 2, 2)]
+    assert diff.changes(2) == {'text': ('b', 'bee')}
+    assert next(diff.records())['changes'] == {'text': ('b', 'bee')}
+
+
+def test_subtree_moved_to_other_parent():
+    card = node('Card', rid='id/card', children=node('Text', 'title') + node('Text', 'body'))
+    a = dump(node('Frame', children=node('List', rid='id/left', children=card) + node('List', rid='id/right')))
+    b = dump(node('Frame', children=node('List', rid='id/left') + node('List', rid='id/right', children=card)))
+    diff = diff_uix(a, b)
+    assert counts(diff) == dict(ZERO, moved=1)
+    assert ops(diff) == [('moved', 2, 3)]
+    assert list(diff.match_a) == [0, 1, 3, 4, 5, 2]
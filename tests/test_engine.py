@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# File: test_engine.py
+# Environment: Python3.6
+# Description: Tests of dump parsing into the node table
+
+import os, re, sys, random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest
+
+from uix_engine import parse_uix, SpatialIndex
+from uix_synth import synthetic_uix
+
+
+def test_mixed_attribute_sets():
+    """Properties first seen on a later node stay missing on nodes without them"""
+    nodes = parse_uix(b'<hierarchy><node class="A"/><node class="B" text="t1"/><node class="C"/>'
+                      b'<node class="D" text="t3" checked="true"/><node class="E"/></hierarchy>')
+    assert [nodes.get(i, 'class') for i in range(len(nodes))] == ['A', 'B', 'C', 'D', 'E']
+    assert [nodes.get(i, 'text') for i in range(len(nodes))] == [None, 't1', None, 't3', None]
+    assert [nodes.get(i, 'checked') for i in range(len(nodes))] == [None, None, None, 'true', None]
+    assert all(len(col) == len(nodes) for col in nodes.columns.values())
+
+
+def long_values_dump(path, stripped_path):
+    """Synthetic dump with long text, content-desc and resource-id values, and the same dump with them empty"""
+    lines = synthetic_uix(300, 8, 5, 0.7, 3).decode('utf-8').split('\n')
+    keep, strip = [], []
+    for n, line in enumerate(lines):
+        if '<node ' in line and n % 7 == 0:
+            key = ('text', 'content-desc', 'resource-id')[n % 3]
+            line = re.sub(key + '="[^"]*"', '{}="{}&amp;{}"'.format(key, 'v' * 50, n), line)
+            strip.append(re.sub(key + '="[^"]*"', key + '=""', line))
+        else:
+            strip.append(line)
+        keep.append(line)
+    for name, out in ((path, keep), (stripped_path, strip)):
+        with open(name, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(out))
+
+
+def test_deferred_values(tmp_path):
+    """Values left in the dump file read back the same as parsed ones"""
+    path, stripped = str(tmp_path / 'long.uix'), str(tmp_path / 'stripped.uix')
+    long_values_dump(path, stripped)
+    full, lean = parse_uix(path), parse_uix(path, 45)
+    assert any(lean.is_deferred(i, 'text') for i in range(len(lean)))
+    for i in range(len(full)):
+        for key in ('class', 'text', 'content-desc', 'resource-id', 'bounds', 'checked'):
+            assert lean.get(i, key) == full.get(i, key)
+
+
+def test_lean_selectors_treat_deferred_values_as_empty(tmp_path):
+    """Selectors of a lean dump are those of the same dump with its long values empty, and never read the file"""
+    path, stripped = str(tmp_path / 'long.uix'), str(tmp_path / 'stripped.uix')
+    long_values_dump(path, stripped)
+    lean, empty = parse_uix(path, 45), parse_uix(stripped)
+    lean.source = (str(tmp_path / 'missing.uix'), 0)  # Reading a deferred value would fail
+    assert [lean.selectors(i) for i in range(len(lean))] == [empty.selectors(i) for i in range(len(empty))]
+
+
+def quadratic_selectors(elements):
+    """Selector generation as it was before the frequency maps, counting every value over all elements"""
+    for ele in elements:
+        ele['xpath'] = ele['uiaSelector'] = ele['indicator'] = ""
+    for ele in elements:
+        flag = [False, False, False, False]
+        if len(ele['content-desc']) > 0:
+            if sum(1 for item in elements if item['content-desc'] == ele['content-desc']) == 1:
+                flag[0] = True
+                ele['indicator'] = 'description=\"{}\"'.format(ele['content-desc'])
+                ele['uiaSelector'] = 'new UiSelector().description(\"{}\")'.format(ele['content-desc'])
+        if len(ele['text']) > 0:
+            if sum(1 for item in elements if item['text'] == ele['text']) == 1:
+                flag[1] = True
+                ele['indicator'] = 'text=\"{}\"'.format(ele['text'])
+                ele['uiaSelector'] = 'new UiSelector().textContains(\"{}\")'.format(ele['text'])
+        if len(ele['class']) > 0:
+            if sum(1 for item in elements if item['class'] == ele['class']) == 1:
+                flag[2] = True
+                ele['indicator'] = 'className=\"{}\"'.format(ele['class'])
+                ele['uiaSelector'] = 'new UiSelector().className(\"{}\")'.format(ele['class'])
+        if len(ele['resource-id']) > 0:
+            if sum(1 for item in elements if item['resource-id'] == ele['resource-id']) == 1:
+                flag[3] = True
+                ele['indicator'] = 'resourceId=\"{}\"'.format(ele['resource-id'])
+                ele['uiaSelector'] = 'new UiSelector().resourceId(\"{}\")'.format(ele['resource-id'])
+
+        if flag[3]:
+            ele['xpath'] = '//' + ele['class'] + '[@resource-id=\"{}\"]'.format(ele['resource-id'])
+        elif flag[2]:
+            ele['xpath'] = '//' + ele['class']
+        else:
+            if len(ele['text']) > 0 and len(ele['content-desc']) > 0:
+                ele['xpath'] = '//' + ele['class'] + '[@text=\"{}\" and @content-desc=\"{}\"]'.format(
+                    ele['text'], ele['content-desc'])
+            if len(ele['text']) > 0 and len(ele['content-desc']) == 0:
+                ele['xpath'] = '//' + ele['class'] + '[@text=\"{}\"]'.format(ele['text'])
+            if len(ele['text']) == 0 and len(ele['content-desc']) > 0:
+                ele['xpath'] = '//' + ele['class'] + '[@content-desc=\"{}\"]'.format(ele['content-desc'])
+
+        if ele['indicator'] == "":
+            if len(ele['resource-id']) > 0:
+                if len(ele['text']) > 0:
+                    ele['uiaSelector'] = 'new UiSelector().className(\"{}\").textContains(\"{}\").resourceId(' \
+                                         '\"{}\")'.format(ele['class'], ele['text'], ele['resource-id'])
+                else:
+                    ele['uiaSelector'] = 'new UiSelector().className(\"{}\").resourceId(' \
+                                         '\"{}\")'.format(ele['class'], ele['resource-id'])
+            elif len(ele['text']) > 0:
+                ele['uiaSelector'] = 'new UiSelector().className(\"{}\").textContains(\"{}\")'.format(
+                    ele['class'], ele['text'])
+    return [(ele['indicator'], ele['uiaSelector'], ele['xpath']) for ele in elements]
+
+
+def test_selectors_match_quadratic_algorithm():
+    """Frequency map selectors are byte-for-byte the ones of counting over all nodes"""
+    dumps = [synthetic_uix(400, 8, 5, dup, seed) for dup, seed in ((0.0, 1), (0.5, 2), (0.9, 3), (1.0, 4))]
+    dumps.append(b'<hierarchy><node class="A" text="x"/><node class="B" text="x" content-desc="d"/>'
+                 b'<node class="B" resource-id="r"/><node class="C" text="" resource-id="r"/>'
+                 b'<node class="D" content-desc="d"/><node class="E" text="y" resource-id="s"/></hierarchy>')
+    for data in dumps:
+        nodes = parse_uix(data)
+        keys = ('content-desc', 'text', 'class', 'resource-id')
+        elements = [dict((key, nodes.get(i, key) or '') for key in keys) for i in range(len(nodes))]
+        assert [nodes.selectors(i) for i in range(len(nodes))] == quadratic_selectors(elements)
+
+
+def linear_find(nodes, x, y, max_area=None):
+    """Hit-test as a linear scan: smallest area, the later node for equal areas, none larger than max_area"""
+    s = max_area if max_area is not None else float('inf')
+    found = None
+    for i in range(len(nodes)):
+        left, top, right, bottom = nodes.left[i], nodes.top[i], nodes.right[i], nodes.bottom[i]
+        if left <= x <= right and top <= y <= bottom and (right - left) * (bottom - top) <= s:
+            s = (right - left) * (bottom - top)
+            found = i
+    return found
+
+
+def rects_dump(rects):
+    """Dump of one node per rectangle (left, top, right, bottom)"""
+    return ('<hierarchy>' + ''.join('<node class="A" bounds="[{},{}][{},{}]"/>'.format(*r) for r in rects) +
+            '</hierarchy>').encode('utf-8')
+
+
+def tied_rects(count, seed):
+    """Rectangles of a few sizes and both orientations, so many equal areas overlap, in and out of the grid"""
+    rnd = random.Random(seed)
+    rects = [(0, 0, 1080, 2340), (0, 0, 1080, 2340)]
+    for _ in range(count):
+        w, h = rnd.choice(((40, 82), (120, 300), (82, 1080), (300, 600), (0, 50)))
+        if rnd.random() < 0.5:
+            w, h = h, w
+        x, y = rnd.randint(0, 1080 - w), rnd.randint(0, 2340 - h)
+        rects.append((x, y, x + w, y + h))
+        if rnd.random() < 0.2:
+            rects.append(rects[-1])  # Identical rectangle later in the dump
+    return rects
+
+
+@pytest.mark.parametrize('data', [synthetic_uix(800, 10, 6, 0.5, 5), synthetic_uix(1500, 14, 4, 0.5, 6),
+                                  rects_dump(tied_rects(300, 7))], ids=['synthetic', 'deep', 'ties'])
+def test_spatial_find_matches_linear_scan(data):
+    nodes = parse_uix(data)
+    spatial = SpatialIndex(nodes)
+    assert spatial.large and any(spatial.grid)
+    rnd = random.Random(8)
+    points = [(rnd.randrange(-10, 1100), rnd.randrange(-10, 2400)) for _ in range(500)]
+    for i in rnd.sample(range(len(nodes)), 150):  # Edges are inside
+        points += [(nodes.left[i], nodes.top[i]), (nodes.right[i], nodes.bottom[i])]
+    for x, y in points:
+        for max_area in (None, 1080 * 2340, 40000, 100):
+            assert spatial.find(x, y, max_area) == linear_find(nodes, x, y, max_area), (x, y, max_area)
+
+
+def test_spatial_find_ties_and_max_area():
+    nodes = parse_uix(rects_dump([(0, 0, 100, 100), (50, 50, 150, 150), (0, 0, 100, 100), (0, 0, 1080, 2340)]))
+    spatial = SpatialIndex(nodes)
+    assert spatial.find(10, 10) == 2  # Equal areas: the later node wins
+    assert spatial.find(75, 75) == 2
+    assert spatial.find(120, 120) == 1
+    assert spatial.find(500, 500) == 3
+    assert spatial.find(500, 500, 1080 * 2340 - 1) is None  # Only node there is larger than max_area
+    assert spatial.find(10, 10, 10000) == 2  # max_area itself is allowed
+    assert spatial.find(10, 10, 9999) is None
+    assert spatial.find(2000, 10) is None
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# File: test_live.py
+# Environment: Python3.6
+# Description: Tests of live updates on a replayed sequence of saved screenshot and uiautomator dump pairs
+
+import os, re, sys, random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from uix_engine import parse_uix, SpatialIndex
+from uix_batch import find_pairs
+from device_capture import ReplayCapture
+from uix_synth import synthetic_uix
+
+BOUNDS = re.compile(r'bounds="\[(\d+),(\d+)\]\[(\d+),(\d+)\]"')
+
+
+def moved_frame(lines, rnd):
+    """Same tree with some nodes moved or resized and some texts changed"""
+    out = []
+    for line in lines:
+        m = BOUNDS.search(line)
+        if m is not None and rnd.random() < 0.2:
+            l, t, r, b = [int(v) for v in m.groups()]
+            dx, dy = rnd.randint(-300, 300), rnd.randint(-300, 300)
+            l, t = max(0, l + dx), max(0, t + dy)
+            r, b = max(l, r + dx + rnd.randint(-50, 50)), max(t, b + dy + rnd.randint(-50, 50))
+            line = BOUNDS.sub('bounds="[{},{}][{},{}]"'.format(l, t, r, b), line)
+        if '<node ' in line and rnd.random() < 0.1:
+            line = re.sub(r' text="[^"]*"', ' text="changed {}"'.format(rnd.random()), line)
+        out.append(line)
+    return out
+
+
+def save_frames(directory):
+    """dump_0 base, dump_1 same tree changed, dump_2 dump_1 with one more node under the top node"""
+    rnd = random.Random(5)
+    base = synthetic_uix(400, 8, 5, 0.7, 5).decode('utf-8').rstrip('\n').split('\n')
+    moved = moved_frame(base, rnd)
+    added = '    <node index="99" text="new" class="android.widget.Button" bounds="[5,5][50,50]" />'
+    inserted = moved[:-2] + [added] + moved[-2:]
+    for n, lines in enumerate((base, moved, inserted)):
+        with open(os.path.join(directory, 'dump_{}.uix'.format(n)), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        with open(os.path.join(directory, 'dump_{}.png'.format(n)), 'wb') as f:
+            f.write(b'\x89PNG frame ' + str(n).encode())
+
+
+def brute_changed(a, b):
+    """Nodes with any different property, comparing every property of both dumps"""
+    return [i for i in range(len(a)) if any(a.get(i, key) != b.get(i, key) for key in set(a.keys) | set(b.keys))]
+
+
+def check_find(spatial, nodes):
+    """Patched index finds the same nodes as one built from scratch"""
+    fresh = SpatialIndex(nodes)
+    for x in range(0, 1100, 23):
+        for y in range(0, 2400, 29):
+            assert spatial.find(x, y) == fresh.find(x, y), (x, y)
+            assert spatial.find(x, y, 40000) == fresh.find(x, y, 40000), (x, y)
+
+
+def test_replay_patches_changed_nodes(tmp_path):
+    save_frames(str(tmp_path))
+    replay = ReplayCapture(sorted(find_pairs(str(tmp_path))))
+    screenshot, xml = replay.run()
+    assert screenshot == b'\x89PNG frame 0'
+    nodes = parse_uix(xml.encode('utf-8'))
+    spatial = SpatialIndex(nodes)
+
+    # Same tree: only changed nodes are patched
+    screenshot, xml = replay.run()
+    new = parse_uix(xml.encode('utf-8'))
+    changed = nodes.changed_nodes(new)
+    assert changed == brute_changed(nodes, new) and changed
+    spatial.update(new, changed)
+    check_find(spatial, new)
+    nodes = new
+
+    # Tree shape changed: no patch, nodes are found again by absolute xpath
+    screenshot, xml = replay.run()
+    new = parse_uix(xml.encode('utf-8'))
+    assert nodes.changed_nodes(new) is None
+    for i in range(len(nodes)):
+        j = new.find_full_index_xpath(nodes.full_index_xpath(i))
+        assert j is not None and new.value(j, 'class') == nodes.value(i, 'class')
+        assert new.rect(j) == nodes.rect(i)
+    added = [j for j in range(len(new)) if new.value(j, 'text') == 'new']
+    assert len(added) == 1 and nodes.find_full_index_xpath(new.full_index_xpath(added[0])) is None
+
+    # Replay starts over after the last pair
+    assert replay.run()[0] == b'\x89PNG frame 0'
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# File: test_query.py
+# Environment: Python3.6
+# Description: Tests of locator evaluation against a brute force scan of every node
+
+import os, sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import pytest
+
+from uix_engine import parse_uix, quoteattr
+from uix_query import QueryEngine
+from uix_synth import synthetic_uix
+
+# Values with brackets, quotes, equal signs and xpath words in them
+ODD = ('Total [3] items', 'a = b', 'say "hi"', 'x and @text', 'Item (1).', '[0,0][1,1]', 'path/to//it')
+
+
+def odd_dump():
+    """Small dump with odd values, repeated classes and values at several depths"""
+    out = ['<hierarchy rotation="0">']
+
+    def node(depth, cls, text='', desc='', rid='', close=True):
+        out.append('<node class={} text={} content-desc={} resource-id={} bounds="[0,0][10,10]"{}>'.format(
+            quoteattr(cls), quoteattr(text), quoteattr(desc), quoteattr(rid), ' /' if close else ''))
+
+    node(0, 'android.widget.FrameLayout', close=False)
+    for n, value in enumerate(ODD):
+        node(1, 'android.widget.LinearLayout', rid='id/row', close=False)
+        node(2, 'android.widget.TextView', text=value, rid='id/title')
+        node(2, 'android.widget.TextView', text='same', desc=value)
+        node(2, 'android.widget.Button', text=value if n % 2 else 'OK', rid='id/button')
+        out.append('</node>')
+    out.append('</node></hierarchy>')
+    return '\n'.join(out).encode('utf-8')
+
+
+DUMPS = {'odd': odd_dump(), 'synthetic': synthetic_uix(600, 10, 6, 0.8, 4)}
+
+
+def where(nodes, **tests):
+    """Brute force: nodes whose properties pass all tests, key_how=value with how equals or contains"""
+    found = list(range(len(nodes)))
+    for name, want in tests.items():
+        key, _, how = name.rpartition('_')
+        values = [nodes.get(i, key.replace('_', '-')) for i in found]
+        found = [i for i, v in zip(found, values)
+                 if v is not None and (v == want if how == 'equals' else want in v)]
+    return found
+
+
+def locators(nodes, i, paths):
+    """Every locator form the helper generates, built from the values of node i, with its brute force match"""
+    desc, text = nodes.value(i, 'content-desc'), nodes.value(i, 'text')
+    cls, rid = nodes.value(i, 'class'), nodes.value(i, 'resource-id')
+    forms = [('className="{}"'.format(cls), where(nodes, class_equals=cls)),
+             ('new UiSelector().className("{}")'.format(cls), where(nodes, class_equals=cls)),
+             ('//' + cls, where(nodes, class_equals=cls))]
+    if desc:
+        forms += [('description="{}"'.format(desc), where(nodes, content_desc_equals=desc)),
+                  ('new UiSelector().description("{}")'.format(desc), where(nodes, content_desc_equals=desc)),
+                  ('//{}[@content-desc="{}"]'.format(cls, desc),
+                   where(nodes, class_equals=cls, content_desc_equals=desc))]
+    if text:
+        forms += [('text="{}"'.format(text), where(nodes, text_equals=text)),
+                  ('new UiSelector().textContains("{}")'.format(text), where(nodes, text_contains=text)),
+                  ('new UiSelector().className("{}").textContains("{}")'.format(cls, text),
+                   where(nodes, class_equals=cls, text_contains=text)),
+                  ('//{}[@text="{}"]'.format(cls, text), where(nodes, class_equals=cls, text_equals=text))]
+    if text and desc:
+        forms.append(('//{}[@text="{}" and @content-desc="{}"]'.format(cls, text, desc),
+                      where(nodes, class_equals=cls, text_equals=text, content_desc_equals=desc)))
+    if rid:
+        forms += [('resourceId="{}"'.format(rid), where(nodes, resource_id_equals=rid)),
+                  ('new UiSelector().resourceId("{}")'.format(rid), where(nodes, resource_id_equals=rid)),
+                  ('new UiSelector().className("{}").resourceId("{}")'.format(cls, rid),
+                   where(nodes, class_equals=cls, resource_id_equals=rid)),
+                  ('//{}[@resource-id="{}"]'.format(cls, rid), where(nodes, class_equals=cls, resource_id_equals=rid))]
+    if rid and text:
+        forms.append(('new UiSelector().className("{}").textContains("{}").resourceId("{}")'.format(cls, text, rid),
+                      where(nodes, class_equals=cls, text_contains=text, resource_id_equals=rid)))
+    # fullIndexXpath starts with //, so it matches every node whose path ends with its steps
+    steps = paths[i]
+    forms.append(('//' + '/'.join(steps), [j for j in range(len(nodes)) if paths[j][-len(steps):] == steps]))
+    return forms
+
+
+@pytest.mark.parametrize('name', sorted(DUMPS))
+def test_generated_locators_match_brute_force(name):
+    nodes = parse_uix(DUMPS[name])
+    engine = QueryEngine(nodes)
+    paths = [nodes.full_index_xpath(j)[2:].split('/') for j in range(len(nodes))]
+    for i in range(len(nodes)):
+        forms = dict(locators(nodes, i, paths))
+        for query in nodes.selectors(i):
+            assert not query or query in forms, query  # Every emitted form is checked below
+        for query, want in forms.items():
+            assert i in want
+            assert engine.select(query) == want, query
+
+
+def nth_children(nodes, parents, cls, n, **tests):
+    """Brute force: per parent, the n-th child of class cls passing tests, 1-based"""
+    found = []
+    allowed = set(where(nodes, class_equals=cls, **tests))
+    for p in parents:
+        kids = [c for c in nodes.children(p) if c in allowed]
+        if len(kids) >= n:
+            found.append(kids[n - 1])
+    return sorted(found)
+
+
+def test_instance_and_positions():
+    nodes = parse_uix(DUMPS['odd'])
+    engine = QueryEngine(nodes)
+    views = where(nodes, class_equals='android.widget.TextView')
+    same = where(nodes, text_equals='same')
+    assert engine.select('new UiSelector().className("android.widget.TextView").instance(3)') == views[3:4]
+    assert engine.select('new UiSelector().text("same").instance(0)') == same[:1]
+    assert engine.select('new UiSelector().text("same").instance(99)') == []
+
+    rows = where(nodes, class_equals='android.widget.LinearLayout')
+    assert engine.select('//android.widget.LinearLayout/android.widget.TextView[2]') == \
+        nth_children(nodes, rows, 'android.widget.TextView', 2)
+    assert engine.select('//android.widget.LinearLayout[3]/android.widget.Button[1]') == \
+        nth_children(nodes, nth_children(nodes, [0], 'android.widget.LinearLayout', 3), 'android.widget.Button', 1)
+    # Position among the siblings passing the attribute test, like XPath
+    assert engine.select('//android.widget.TextView[@text="same"][1]') == \
+        nth_children(nodes, [0] + rows, 'android.widget.TextView', 1, text_equals='same')
+    full = '//android.widget.FrameLayout[1]/android.widget.LinearLayout[7]/android.widget.Button[1]'
+    assert engine.select(full) == [nodes.find_full_index_xpath(full)]
+    assert engine.select('//*[@resource-id="id/button"]') == where(nodes, resource_id_equals='id/button')
+
+
+def test_unsupported_locators():
+    engine = QueryEngine(parse_uix(DUMPS['odd']))
+    for query in ('new UiSelector().childSelector(new UiSelector())', '//a//b', '//a[contains(@text, "x")]',
+                  'no indicator'):
+        with pytest.raises(ValueError):
+            engine.select(query)
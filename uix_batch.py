@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# File: uix_batch.py
+# Environment: Python3.6
+# Description: Index saved dump_<timestamp>.png/.uix pairs under a directory into one SQLite file, using a process pool
+
+import sys, os, time, argparse, sqlite3, traceback
+from multiprocessing import Pool, cpu_count
+
+from uix_engine import parse_uix, find_screenshot
+
+DUMP_EXTS = ('.uix', '.xml')
+INDEXED_ATTRS = (('class', 'class'), ('resource_id', 'resource-id'), ('text', 'text'), ('content_desc', 'content-desc'))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dumps (
+    id INTEGER PRIMARY KEY,
+    uix TEXT UNIQUE,
+    png TEXT,
+    mtime REAL,
+    node_count INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    dump_id INTEGER,
+    node INTEGER,
+    parent INTEGER,
+    depth INTEGER,
+    class TEXT,
+    resource_id TEXT,
+    text TEXT,
+    content_desc TEXT,
+    left INTEGER,
+    top INTEGER,
+    right INTEGER,
+    bottom INTEGER,
+    indicator TEXT,
+    uia_selector TEXT,
+    xpath TEXT,
+    full_index_xpath TEXT,
+    PRIMARY KEY (dump_id, node)
+);
+'''
+
+
+def find_pairs(root):
+    """Find screenshot and uiautomator dump pairs with the same name under root, png is None if missing"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in DUMP_EXTS:
+                uix = os.path.join(dirpath, name)
+                yield uix, find_screenshot(uix)
+
+
+def index_dump(pair):
+    """Worker: parse one dump and generate selectors, return (uix, png, mtime, rows, error)"""
+    uix, png = pair
+    try:
+        mtime = os.path.getmtime(uix)
+        nodes = parse_uix(uix)
+        rows = []
+        for i in range(len(nodes)):
+            indicator, uia, xpath = nodes.selectors(i)
+            rows.append((i, nodes.parent[i], nodes.depth[i]) +
+                        tuple(nodes.value(i, key) for name, key in INDEXED_ATTRS) + nodes.rect(i) +
+                        (indicator, uia, xpath, nodes.full_index_xpath(i)))
+        return uix, png, mtime, rows, None
+    except Exception:
+        return uix, png, None, [], traceback.format_exc()
+
+
+def build_index(root, output, jobs=None, chunksize=8, maxtasks=200, progress=None):
+    """Index all dump pairs under root into SQLite file output by absolute path, return number of dumps indexed"""
+    db = sqlite3.connect(output)
+    db.executescript(SCHEMA)
+    # Skip dumps indexed by an earlier run, unless they failed or changed since
+    indexed = dict((os.path.abspath(uix), (dump_id, mtime, error))
+                   for dump_id, uix, mtime, error in db.execute("SELECT id, uix, mtime, error FROM dumps"))
+    pairs, stale = [], []
+    for uix, png in find_pairs(os.path.abspath(root)):
+        if uix in indexed:
+            dump_id, mtime, error = indexed[uix]
+            if error is None and mtime == os.path.getmtime(uix):
+                continue
+            stale.append((dump_id,))
+        pairs.append((uix, png))
+    db.executemany("DELETE FROM nodes WHERE dump_id = ?", stale)
+    db.executemany("DELETE FROM dumps WHERE id = ?", stale)
+    db.commit()
+
+    count = 0
+    # Workers are recycled after maxtasks dumps, and results are consumed as they come, to bound memory
+    with Pool(jobs or cpu_count(), maxtasksperchild=maxtasks) as pool:
+        for uix, png, mtime, rows, error in pool.imap_unordered(index_dump, pairs, chunksize):
+            cur = db.execute("INSERT INTO dumps (uix, png, mtime, node_count, error) VALUES (?, ?, ?, ?, ?)",
+                             (uix, png, mtime, len(rows), error))
+            dump_id = cur.lastrowid
+            db.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(dump_id,) + row for row in rows])
+            count += 1
+            if count % 500 == 0:
+                db.commit()
+            if progress is not None:
+                progress(count, len(pairs), uix)
+    db.commit()
+
+    # Global attribute index: lookups by value across all dumps, and how common every value is
+    for name, key in INDEXED_ATTRS:
+        db.execute("CREATE INDEX IF NOT EXISTS nodes_{0} ON nodes ({0})".format(name))
+    db.execute("DROP TABLE IF EXISTS attr_counts")
+    db.execute("CREATE TABLE attr_counts (attr TEXT, value TEXT, dump_count INTEGER, node_count INTEGER)")
+    for name, key in INDEXED_ATTRS:
+        db.execute("INSERT INTO attr_counts SELECT ?, {0}, COUNT(DISTINCT dump_id), COUNT(*) FROM nodes "
+                   "WHERE {0} != '' GROUP BY {0}".format(name), (key,))
+    db.execute("CREATE INDEX IF NOT EXISTS attr_counts_value ON attr_counts (attr, value)")
+    db.commit()
+    db.close()
+    return count
+
+
+def main(argv=None):
+    """Command line: index a directory of saved dumps"""
+    ap = argparse.ArgumentParser(description="Index saved screenshot/uiautomator dump pairs into one SQLite file")
+    ap.add_argument('root', help="directory to search for dump_*.png/.uix pairs")
+    ap.add_argument('-o', '--output', default='uix_index.sqlite', help="SQLite index file, updated if it exists")
+    ap.add_argument('-j', '--jobs', type=int, default=None, help="worker processes, default is CPU count")
+    ap.add_argument('--chunksize', type=int, default=8, help="dumps sent to a worker at once")
+    args = ap.parse_args(argv)
+
+    start = time.time()
+
+    def progress(n, total, uix):
+        if n % 100 == 0 or n == total:
+            sys.stderr.write("\r{}/{} dumps".format(n, total))
+            sys.stderr.flush()
+
+    n = build_index(args.root, args.output, args.jobs, args.chunksize, progress=progress)
+    sys.stderr.write("\nIndexed {} dumps in {:.1f}s to {}\n".format(n, time.time() - start, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
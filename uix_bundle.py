@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+# File: uix_bundle.py
+# Environment: Python3.6
+# Description: Single file bundle of screenshot, uiautomator dump, parsed node table and spatial index, without Qt
+#
+# Layout: 8 byte magic, version and section count, then one (name, offset, length) entry per section. Sections
+# start at 8 byte boundaries: meta (JSON), screenshot (PNG or screencap raw frame as captured), hierarchy (dump
+# bytes as captured or saved), strings (string pool joined by NUL) and one section per node table array and
+# spatial index array, in the byte order given in meta. Opening a bundle maps the file and reads the sections
+# asked for: node arrays are copied out as they are, nothing is parsed.
+
+import sys, os, json, mmap, struct, argparse, tempfile
+from array import array
+
+from uix_engine import NodeStore, SpatialIndex, Deferred, parse_uix, format_uix, find_screenshot
+
+MAGIC = b'UIXBNDL\0'
+VERSION = 1
+HEADER = struct.Struct('<8sII')  # Magic, version, section count
+ENTRY = struct.Struct('<32sQQ')  # Section name, offset, length
+NODE_ARRAYS = ('parent', 'depth', 'left', 'top', 'right', 'bottom', 'flags', 'ordinal', 'row', 'child_start',
+               'child_nodes')
+BUNDLE_EXT = '.uixb'
+
+
+def is_bundle(path):
+    """Whether file starts like a bundle"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def file_mode():
+    """Mode of a newly created file under the current umask"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_bundle(path, screenshot, hierarchy, nodes=None, spatial=None):
+    """Write bundle of screenshot bytes and dump (bytes or str), the dump is parsed if nodes are not given"""
+    if isinstance(hierarchy, str):
+        hierarchy = hierarchy.encode('utf-8')
+    if nodes is None:
+        nodes = parse_uix(hierarchy)
+    if spatial is None:
+        spatial = SpatialIndex(nodes)
+    start, items, large = spatial.grid_arrays()
+    sections = [('screenshot', screenshot), ('hierarchy', hierarchy),
+                ('strings', '\0'.join(nodes.strings).encode('utf-8'))]
+    typecodes = {}
+    for name in NODE_ARRAYS:
+        sections.append(('a:' + name, getattr(nodes, name)))
+        typecodes['a:' + name] = getattr(nodes, name).typecode
+    for key, col in nodes.columns.items():
+        sections.append(('c:' + key, col))
+        typecodes['c:' + key] = col.typecode
+    for name, values in (('cell_start', start), ('cell_items', items), ('large', large)):
+        sections.append(('s:' + name, values))
+        typecodes['s:' + name] = values.typecode
+    meta = {'version': VERSION, 'byteorder': sys.byteorder, 'nodes': len(nodes), 'keys': nodes.keys,
+            'columns': list(nodes.columns), 'strings': len(nodes.strings), 'typecodes': typecodes,
+            'extra': [[i, key, {'deferred': v.offset} if isinstance(v, Deferred) else v]
+                      for (i, key), v in sorted(nodes.extra.items(), key=lambda item: item[0])],
+            'spatial': {'cell': spatial.cell, 'cols': spatial.cols, 'rows': spatial.rows},
+            'screenshot': 'png' if screenshot.startswith(b'\x89PNG') else 'raw'}
+    sections.insert(0, ('meta', json.dumps(meta).encode('utf-8')))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            offset = HEADER.size + ENTRY.size * len(sections)
+            table = []
+            for name, data in sections:
+                if len(name.encode('utf-8')) > 32:
+                    raise ValueError("Property name too long for a bundle section: " + name)
+                offset += -offset % 8
+                length = len(data) * (data.itemsize if isinstance(data, array) else 1)
+                table.append(ENTRY.pack(name.encode('utf-8'), offset, length))
+                offset += length
+            f.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+            f.write(b''.join(table))
+            for name, data in sections:
+                f.write(b'\0' * (-f.tell() % 8))
+                f.write(data)  # Arrays are written as they are in memory
+        os.chmod(tmp, file_mode())  # Temporary files are private, bundles are not
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return path
+
+
+class Bundle(object):
+    """Memory-mapped bundle file, each section is read on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, count = HEADER.unpack_from(self.map, 0)
+            if magic != MAGIC:
+                raise ValueError("Not a uiautomator dump bundle: " + path)
+            if version != VERSION:
+                raise ValueError("Unsupported bundle version {}: {}".format(version, path))
+            self.sections = {}  # Name -> (offset, length)
+            for n in range(count):
+                name, offset, length = ENTRY.unpack_from(self.map, HEADER.size + n * ENTRY.size)
+                if offset + length > len(self.map):
+                    raise ValueError("Truncated bundle: " + path)
+                self.sections[name.rstrip(b'\0').decode('utf-8')] = (offset, length)
+        except Exception:
+            self.close()
+            raise
+        self.meta = json.loads(self.section('meta').decode('utf-8'))
+        self._nodes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        if getattr(self, 'map', None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def section(self, name):
+        """Section contents as bytes"""
+        offset, length = self.sections[name]
+        return self.map[offset:offset + length]
+
+    def array(self, name):
+        """Section as array of its saved type, in native byte order"""
+        offset, length = self.sections[name]
+        values = array(self.meta['typecodes'][name])
+        with memoryview(self.map) as view:
+            with view[offset:offset + length] as part:
+                values.frombytes(part)
+        if self.meta['byteorder'] != sys.byteorder:
+            values.byteswap()
+        return values
+
+    def screenshot(self):
+        """Screenshot bytes, PNG or screencap raw frame"""
+        return self.section('screenshot')
+
+    def hierarchy(self):
+        """Uiautomator dump bytes"""
+        return self.section('hierarchy')
+
+    def nodes(self):
+        """Node table, from saved arrays and string pool"""
+        if self._nodes is None:
+            meta = self.meta
+            store = NodeStore()
+            store.keys = list(meta['keys'])
+            for name in NODE_ARRAYS:
+                setattr(store, name, self.array('a:' + name))
+            store.columns = dict((key, self.array('c:' + key)) for key in meta['columns'])
+            store.strings = self.section('strings').decode('utf-8').split('\0') if meta['strings'] else []
+            store.string_ids = dict(zip(store.strings, range(len(store.strings))))
+            store.extra = dict(((i, key), Deferred(v['deferred']) if isinstance(v, dict) else v)
+                               for i, key, v in meta['extra'])
+            if any(isinstance(v, dict) for i, key, v in meta['extra']):
+                store.source = (os.path.abspath(self.path), self.sections['hierarchy'][0])  # Dump is in the bundle
+            store.count_values()
+            self._nodes = store
+        return self._nodes
+
+    def spatial(self):
+        """Spatial index of node table, from saved grid"""
+        s = self.meta['spatial']
+        return SpatialIndex.from_grid_arrays(self.nodes(), s['cell'], s['cols'], s['rows'], self.array('s:cell_start'),
+                                             self.array('s:cell_items'), self.array('s:large'))
+
+
+def pack_pair(uix, png, path=None):
+    """Bundle of a saved screenshot and uiautomator dump pair, next to the dump by default, never overwriting"""
+    path = path or os.path.splitext(uix)[0] + BUNDLE_EXT
+    if os.path.exists(path):
+        raise FileExistsError("Not overwriting " + path)
+    with open(png, 'rb') as f:
+        screenshot = f.read()
+    with open(uix, 'rb') as f:
+        hierarchy = f.read()
+    return write_bundle(path, screenshot, hierarchy)
+
+
+def unpack_bundle(path, stem=None):
+    """Write bundle as screenshot and uiautomator dump pair stem.png and stem.uix, like the Save button does
+
+    Existing files are never overwritten, FileExistsError is raised before anything is written.
+    """
+    stem = stem or os.path.splitext(path)[0]
+    with Bundle(path) as bundle:
+        png = stem + ('.png' if bundle.meta['screenshot'] == 'png' else '.raw')
+        uix = stem + '.uix'
+        for name in (png, uix):
+            if os.path.exists(name):
+                raise FileExistsError("Not overwriting " + name)
+        with open(png, 'xb') as f:
+            f.write(bundle.screenshot())
+        with open(uix, 'x', encoding='utf-8') as f:
+            f.write(format_uix(bundle.hierarchy()))
+    return uix, png
+
+
+def main(argv=None):
+    """Command line: pack pairs into bundles, unpack bundles into pairs, list sections"""
+    ap = argparse.ArgumentParser(description="Single file bundles of screenshot, uiautomator dump and parsed nodes")
+    sub = ap.add_subparsers(dest='command')
+    p = sub.add_parser('pack', help="bundle saved dump_<timestamp>.png/.uix pairs, next to each dump, "
+                                    "never overwriting")
+    p.add_argument('paths', nargs='+', help="dumps or directories of pairs")
+    p = sub.add_parser('unpack', help="write bundles as .png/.uix pairs, next to each bundle, never overwriting")
+    p.add_argument('paths', nargs='+', help="bundles")
+    p.add_argument('-d', '--dir', help="directory to write the pairs to instead")
+    p = sub.add_parser('info', help="print sections of bundles as JSON")
+    p.add_argument('paths', nargs='+', help="bundles")
+    args = ap.parse_args(argv)
+    if args.command is None:
+        ap.error("give a command")
+
+    out = sys.stdout
+    for path in args.paths:
+        if args.command == 'pack':
+            if os.path.isdir(path):
+                from uix_batch import find_pairs
+                pairs = list(find_pairs(path))
+            else:
+                pairs = [(path, find_screenshot(path))]
+            for uix, png in pairs:
+                if png is None:
+                    out.write(json.dumps({'uix': uix, 'error': "no screenshot"}) + "\n")
+                    continue
+                try:
+                    bundle = pack_pair(uix, png)
+                except FileExistsError as e:
+                    out.write(json.dumps({'uix': uix, 'error': str(e)}) + "\n")
+                    continue
+                out.write(json.dumps({'uix': uix, 'png': png, 'bundle': bundle}) + "\n")
+        elif args.command == 'unpack':
+            stem = os.path.join(args.dir, os.path.splitext(os.path.basename(path))[0]) if args.dir else None
+            try:
+                uix, png = unpack_bundle(path, stem)
+            except FileExistsError as e:
+                out.write(json.dumps({'bundle': path, 'error': str(e)}) + "\n")
+                continue
+            out.write(json.dumps({'bundle': path, 'uix': uix, 'png': png}) + "\n")
+        else:
+            with Bundle(path) as bundle:
+                out.write(json.dumps({'bundle': path, 'nodes': bundle.meta['nodes'],
+                                      'screenshot': bundle.meta['screenshot'], 'sections': bundle.sections}) + "\n")
+    out.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# File: uix_cache.py
+# Environment: Python3.6
+# Description: On-disk cache of parsed uiautomator dumps, keyed by hash of the dump contents
+
+import os, pickle, hashlib, tempfile
+
+from uix_engine import parse_uix, SpatialIndex
+from uix_trace import tracer
+
+CACHE_VERSION = 2  # Change when NodeStore or SpatialIndex layout changes
+
+
+class DumpCache(object):
+    """Parsed node table and spatial index of dumps, with least recently used entries evicted over max_bytes"""
+
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        if directory is None:
+            directory = os.environ.get('UIAUTOMATORHELPER_CACHE') or \
+                        os.path.join(os.path.expanduser('~'), '.cache', 'UiautomatorHelper')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.write_errors = 0
+
+    @staticmethod
+    def key(data):
+        """Cache key of dump contents"""
+        return hashlib.sha1(data).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.bin')
+
+    def get(self, key):
+        """Get (nodes, spatial) for key, None if not cached"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                version, nodes, spatial = pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if version != CACHE_VERSION:
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return nodes, spatial
+
+    def put(self, key, nodes, spatial):
+        """Save (nodes, spatial) for key, then evict old entries"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((CACHE_VERSION, nodes, spatial), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path(key))
+        except OSError:
+            self.write_errors += 1  # Cache is an optimization, loading goes on without it
+            tracer.count('cache.write_errors', self.write_errors)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until cache size is below max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.bin'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+        entries.sort()
+        for mtime, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+    def load(self, data):
+        """Get (nodes, spatial) of dump contents, parse and cache it if not cached"""
+        return self._load(self.key(data), lambda: parse_uix(data), len(data))
+
+    def load_file(self, path, max_value=None):
+        """Get (nodes, spatial) of dump file read once, with max_value (see parse_uix()) in chunks and never whole"""
+        if max_value is None:
+            with open(path, 'rb') as f:
+                return self.load(f.read())
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        key = digest.hexdigest() + '-{}'.format(max_value)
+        nodes, spatial = self._load(key, lambda: parse_uix(path, max_value), os.path.getsize(path))
+        if nodes.source is not None:
+            nodes.source = (os.path.abspath(path), 0)  # Same contents, maybe cached from another file
+        return nodes, spatial
+
+    def _load(self, key, parse, size):
+        with tracer.span('cache.read'):
+            cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            tracer.count('cache.hits', self.hits)
+            return cached
+        self.misses += 1
+        tracer.count('cache.misses', self.misses)
+        with tracer.span('parse', bytes=size):
+            nodes = parse()
+        with tracer.span('spatial'):
+            spatial = SpatialIndex(nodes)
+        with tracer.span('cache.write'):
+            self.put(key, nodes, spatial)
+        return nodes, spatial
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# File: uix_diff.py
+# Environment: Python3.6
+# Description: Structural diff of two uiautomator dumps: inserted, removed, moved and changed nodes, without Qt
+
+import sys, json, argparse
+from collections import Counter, defaultdict, deque
+from bisect import bisect_left
+
+from uix_engine import parse_uix, tuple_getter, Deferred
+
+IGNORED = ('index',)  # Position among siblings, changes whenever a sibling is inserted or removed
+MATCH_KEYS = (('class', 'resource-id', 'text', 'content-desc'), ('class', 'resource-id', 'text'),
+              ('class', 'resource-id'), ('class',))  # Sibling matching keys, most specific first
+
+
+def string_keys(a, b):
+    """String properties of either dump which are compared, flags and bounds are compared separately"""
+    return sorted((set(a.columns) | set(b.columns)) - set(IGNORED))
+
+
+def node_labels(nodes, keys):
+    """Properties of every node as tuple: string properties keys, flags and raw values, comparable across dumps"""
+    pool = nodes.strings + [None]  # -1 picks None, a missing property
+    cols = [list(map(pool.__getitem__, nodes.columns[key])) if key in nodes.columns else [None] * len(nodes)
+            for key in keys]
+    labels = list(zip(*cols)) if cols else [()] * len(nodes)
+    labels = [label + (flags,) for label, flags in zip(labels, nodes.flags)]
+    if nodes.extra:
+        extra = defaultdict(list)
+        positions = dict((key, n) for n, key in enumerate(keys))
+        for (i, key), v in nodes.extra.items():
+            if isinstance(v, Deferred) and key in positions:
+                # Value left in the dump file, compared like it was kept in its column
+                label = list(labels[i])
+                label[positions[key]] = nodes.get(i, key)
+                labels[i] = tuple(label)
+            elif key not in IGNORED and key != 'bounds':
+                extra[i].append((key, nodes.get(i, key)))
+        for i, items in extra.items():
+            labels[i] = labels[i] + tuple(sorted(items, key=lambda item: item[0]))
+    return labels
+
+
+class TreeDiff(object):
+    """Match nodes of dump a to nodes of dump b, near linear: identical subtrees by hash first, then keys
+
+    Subtrees with the same hash only in a and b are matched whole. Then nodes with a key (class, resource-id,
+    text, content-desc) found once in each dump are matched, and finally children of matched parents are
+    paired by subtree hash or the most specific key they share, in order.
+    """
+
+    def __init__(self, a, b):
+        self.a, self.b = a, b
+        keys = string_keys(a, b)
+        self.labels_a = node_labels(a, keys)
+        self.labels_b = node_labels(b, keys)
+        # Matching keys as getters of label tuples, properties missing in both dumps are left out
+        self.key_getters = [tuple_getter([keys.index(name) for name in key if name in keys]) for key in MATCH_KEYS]
+        self.hash_a, self.size_a = self._subtree_hashes(a, self.labels_a)
+        self.hash_b, self.size_b = self._subtree_hashes(b, self.labels_b)
+        self.match_a = [-1] * len(a)  # Node of b matched to node of a, -1 if removed
+        self.match_b = [-1] * len(b)  # Node of a matched to node of b, -1 if inserted
+        self._match_unique_subtrees()
+        self._match_unique_keys()
+        self._match_children()
+        self._classify()
+
+    @staticmethod
+    def _subtree_hashes(nodes, labels):
+        """Hash of every subtree and its node count, children are hashed before their parent"""
+        n = len(nodes)
+        hashes = [0] * n
+        sizes = [1] * n
+        for i in range(n - 1, -1, -1):
+            children = nodes.children(i)
+            hashes[i] = hash((labels[i], tuple(hashes[c] for c in children)))
+            for c in children:
+                sizes[i] += sizes[c]
+        return hashes, sizes
+
+    def _match(self, i, j):
+        self.match_a[i] = j
+        self.match_b[j] = i
+
+    def _match_subtree(self, i, j):
+        """Match identical subtrees node by node, subtrees are contiguous in document order"""
+        for k in range(self.size_a[i]):
+            self._match(i + k, j + k)
+
+    def _match_unique_subtrees(self):
+        """Match subtrees with a hash found once in a and once in b, largest subtrees first"""
+        count_a = Counter(self.hash_a)
+        first_b = {}
+        count_b = Counter(self.hash_b)
+        for j, h in enumerate(self.hash_b):
+            if count_b[h] == 1:
+                first_b[h] = j
+        for i, h in enumerate(self.hash_a):  # Document order visits a subtree before its descendants
+            if self.match_a[i] >= 0 or count_a[h] != 1:
+                continue
+            j = first_b.get(h)
+            if j is not None and self.match_b[j] < 0:
+                self._match_subtree(i, j)
+
+    def _match_unique_keys(self):
+        """Match nodes whose full key is found once in each dump and says something about the node"""
+        key = self.key_getters[0]
+        keys_a = list(map(key, self.labels_a))
+        keys_b = list(map(key, self.labels_b))
+        count_a = Counter(keys_a)
+        count_b = Counter(keys_b)
+        by_key = dict((k, j) for j, k in enumerate(keys_b))
+        for i, k in enumerate(keys_a):
+            if self.match_a[i] >= 0:
+                continue
+            if not any(k[1:]) or count_a[k] != 1 or count_b[k] != 1:
+                continue  # Only class, or not unique
+            j = by_key[k]
+            if self.match_b[j] < 0:
+                self._match(i, j)
+
+    def _match_children(self):
+        """Pair unmatched children of matched parents, top down, by subtree hash, then by the best shared key"""
+        for p in [-1] + list(range(len(self.a))):
+            q = self.match_a[p] if p >= 0 else -1
+            if p >= 0 and q < 0:
+                continue
+            left = [i for i in self.a.children(p) if self.match_a[i] < 0]
+            if not left:
+                continue
+            right = [j for j in self.b.children(q) if self.match_b[j] < 0]
+            if not right:
+                continue
+            buckets = defaultdict(deque)
+            for j in right:
+                buckets[self.hash_b[j]].append(j)
+            rest = []
+            for i in left:
+                bucket = buckets.get(self.hash_a[i])
+                while bucket and self.match_b[bucket[0]] >= 0:
+                    bucket.popleft()
+                if bucket:
+                    self._match_subtree(i, bucket.popleft())
+                else:
+                    rest.append(i)
+            for key in self.key_getters:
+                if not rest:
+                    break
+                buckets = defaultdict(deque)
+                for j in right:
+                    if self.match_b[j] < 0:
+                        buckets[key(self.labels_b[j])].append(j)
+                left, rest = rest, []
+                for i in left:
+                    bucket = buckets.get(key(self.labels_a[i]))
+                    if bucket:
+                        self._match(i, bucket.popleft())
+                    else:
+                        rest.append(i)
+
+    def _classify(self):
+        """Sort nodes into removed, inserted, moved and changed"""
+        a, b = self.a, self.b
+        self.removed = [i for i, j in enumerate(self.match_a) if j < 0]
+        self.inserted = [j for j, i in enumerate(self.match_b) if i < 0]
+        moved = set()
+        for i, j in enumerate(self.match_a):
+            if j < 0:
+                continue
+            pa = a.parent[i]
+            if (self.match_a[pa] if pa >= 0 else -1) != b.parent[j]:
+                moved.add(i)  # Parent changed
+        # Reordered siblings: matched children not in the longest run that kept its order
+        for p in [-1] + list(range(len(a))):
+            rows = [(self.match_a[i], i) for i in a.children(p) if self.match_a[i] >= 0 and i not in moved]
+            if len(rows) > 1:
+                keep = self._in_order(rows)
+                moved.update(i for j, i in rows if i not in keep)
+        self.moved = sorted(moved)
+        self.changed = [i for i, j in enumerate(self.match_a) if j >= 0 and
+                        (self.labels_a[i] != self.labels_b[j] or a.rect(i) != b.rect(j) or
+                         a.get(i, 'bounds') != b.get(j, 'bounds'))]
+
+    @staticmethod
+    def _in_order(rows):
+        """Nodes of the longest increasing run of (b node, a node) rows, patience sorting"""
+        tails = []  # Smallest b node ending a run of each length
+        tail_at = []
+        prev = {}
+        for j, i in rows:
+            n = bisect_left(tails, j)
+            prev[i] = tail_at[n - 1] if n > 0 else None
+            if n == len(tails):
+                tails.append(j)
+                tail_at.append(i)
+            else:
+                tails[n] = j
+                tail_at[n] = i
+        keep = set()
+        i = tail_at[-1] if tail_at else None
+        while i is not None:
+            keep.add(i)
+            i = prev[i]
+        return keep
+
+    def changes(self, i):
+        """Changed properties of matched node i of a as {name: (old, new)}"""
+        j = self.match_a[i]
+        names = [key for key in self.a.keys if key not in IGNORED]
+        names += [key for key in self.b.keys if key not in IGNORED and key not in self.a.keys]
+        return dict((key, (self.a.get(i, key), self.b.get(j, key))) for key in names
+                    if self.a.get(i, key) != self.b.get(j, key))
+
+    def summary(self):
+        """Number of nodes in each category"""
+        return {'nodes_a': len(self.a), 'nodes_b': len(self.b), 'matched': len(self.a) - len(self.removed),
+                'inserted': len(self.inserted), 'removed': len(self.removed), 'moved': len(self.moved),
+                'changed': len(self.changed)}
+
+    def records(self):
+        """Differences as JSON-friendly dicts, in document order of a, then inserted nodes in order of b"""
+        moved = set(self.moved)
+        changed = set(self.changed)
+        for i in range(len(self.a)):
+            j = self.match_a[i]
+            if j < 0:
+                yield self._record('removed', i, None)
+                continue
+            if i in moved:
+                yield self._record('moved', i, j)
+            if i in changed:
+                record = self._record('changed', i, j)
+                record['changes'] = self.changes(i)
+                yield record
+        for j in self.inserted:
+            yield self._record('inserted', None, j)
+
+    def _record(self, op, i, j):
+        nodes, k = (self.a, i) if i is not None else (self.b, j)
+        return {'op': op, 'a': i, 'b': j, 'class': nodes.value(k, 'class'),
+                'resource-id': nodes.value(k, 'resource-id'), 'text': nodes.value(k, 'text'),
+                'bounds': list(nodes.rect(k)),
+                'fullIndexXpath': nodes.full_index_xpath(k)}
+
+
+def diff_uix(a, b):
+    """Diff two dumps, given as file paths or bytes"""
+    return TreeDiff(parse_uix(a), parse_uix(b))
+
+
+def main(argv=None):
+    """Command line: print differences between two uiautomator dumps as JSON Lines"""
+    ap = argparse.ArgumentParser(description="Structural diff of two uiautomator dumps (.uix/.xml)")
+    ap.add_argument('a', help="dump before")
+    ap.add_argument('b', help="dump after")
+    ap.add_argument('--summary', action='store_true', help="only print number of nodes per category")
+    args = ap.parse_args(argv)
+
+    diff = diff_uix(args.a, args.b)
+    out = sys.stdout
+    if not args.summary:
+        for record in diff.records():
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    out.write(json.dumps(dict(diff.summary(), summary=True)) + "\n")
+    out.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,663 @@
+# -*- coding: utf-8 -*-
+# File: uix_engine.py
+# Environment: Python3.6
+# Description: Parse uiautomator dump, generate selectors and find nodes by point, without Qt
+
+import sys, os, json, argparse
+import re
+from array import array
+from collections import Counter
+from operator import itemgetter
+from xml.parsers import expat
+
+
+BOUNDS_RE = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]$')
+
+# Boolean properties of a node, each one is a bit of NodeStore.flags
+FLAGS = ('checkable', 'checked', 'clickable', 'enabled', 'focusable', 'focused', 'scrollable', 'long-clickable',
+         'password', 'selected')
+FLAG_BITS = dict((name, 1 << n) for n, name in enumerate(FLAGS))
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')  # Screenshot files next to a dump, in order of preference
+
+
+def find_screenshot(uix):
+    """Screenshot file with the same name as dump, None if there is none"""
+    stem = os.path.splitext(uix)[0]
+    for ext in IMAGE_EXTS:
+        if os.path.exists(stem + ext):
+            return stem + ext
+    return None
+
+
+def tuple_getter(positions):
+    """Function returning the values at positions as tuple"""
+    if len(positions) == 1:
+        p = positions[0]
+        return lambda values: (values[p],)
+    if len(positions) == 0:
+        return lambda values: ()
+    return itemgetter(*positions)
+
+
+class Deferred(object):
+    """Property value left in the dump file, at the start tag of its node, see NodeStore.deferred_value()"""
+    __slots__ = ('offset',)
+
+    def __init__(self, offset):
+        self.offset = offset  # Byte offset of the start tag in the dump
+
+    def __getstate__(self):
+        return self.offset
+
+    def __setstate__(self, offset):
+        self.offset = offset
+
+
+class _Found(Exception):
+    """Stops parsing once the wanted start tag is read"""
+
+
+class NodeStore(object):
+    """Columnar table of uiautomator dump nodes in document order: typed arrays, flag bits and interned strings"""
+
+    def __init__(self):
+        self.keys = []  # Property names in dump order
+        self.parent = array('i')  # Parent node index, -1 for top nodes
+        self.depth = array('i')  # Node level, 1 for top nodes
+        self.left = array('i')
+        self.top = array('i')
+        self.right = array('i')
+        self.bottom = array('i')
+        self.flags = array('H')  # Bitset of FLAGS
+        self.columns = {}  # Property name -> array of string ids, -1 if node has no such property
+        self.strings = []  # Interned string pool
+        self.string_ids = {}
+        self.extra = {}  # (node, property) -> raw value which does not fit its typed column, None if missing
+        self.counts = {}  # Property name -> Counter of string ids, used for selector generation
+        self.layouts = {}  # Property names of a node -> value positions, see _layout()
+        self.ordinal = array('i')  # Position among siblings of the same class, 1-based
+        self.source = None  # (file path, offset of the dump in it) holding Deferred values
+        self.deferred = {}  # Recently read Deferred values by (node, property)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['layouts'] = {}  # Holds getter functions, rebuilt when nodes are added
+        state['deferred'] = {}
+        return state
+
+    def add(self, parent, depth, attrs):
+        """Append node with properties as flat [name, value, ...] list, return node index"""
+        i = len(self.parent)
+        self.parent.append(parent)
+        self.depth.append(depth)
+        names = tuple(attrs[0::2])
+        layout = self.layouts.get(names)
+        if layout is None:
+            layout = self.layouts[names] = self._layout(i, names)
+        string_values, string_cols, flag_values, flag_bits, bounds_at, missing, masks = layout
+        values = attrs[1::2]
+
+        strings = self.strings
+        string_ids = self.string_ids
+        for col, v in zip(string_cols, string_values(values)):
+            sid = string_ids.get(v)
+            if sid is None:
+                sid = string_ids[v] = len(strings)
+                strings.append(v)
+            col.append(sid)
+
+        fv = flag_values(values)
+        mask = masks.get(fv)
+        if mask is None:
+            mask = self._flag_mask(i, flag_bits, fv)
+            if all(v in ('true', 'false') for v in fv):
+                masks[fv] = mask  # Same values always give the same bits
+        self.flags.append(mask)
+
+        m = BOUNDS_RE.match(values[bounds_at]) if bounds_at is not None else None
+        if m is not None:
+            self.left.append(int(m.group(1)))
+            self.top.append(int(m.group(2)))
+            self.right.append(int(m.group(3)))
+            self.bottom.append(int(m.group(4)))
+        else:
+            self.left.append(0)
+            self.top.append(0)
+            self.right.append(-1)
+            self.bottom.append(-1)
+            if bounds_at is not None:
+                self.extra[(i, 'bounds')] = values[bounds_at]
+
+        if missing:  # Node has not all properties of the dump
+            for key in missing:
+                col = self.columns.get(key)
+                if col is not None:
+                    col.append(-1)
+                else:
+                    self.extra[(i, key)] = None
+        return i
+
+    def _layout(self, i, names):
+        """Positions of string, flag and bounds values for nodes with these property names"""
+        for key in names:
+            if key in self.keys:
+                continue
+            self.keys.append(key)
+            self.layouts.clear()  # Their missing properties do not include the new one
+            if key in FLAG_BITS or key == 'bounds':
+                for j in range(i):  # Earlier nodes have no such property
+                    self.extra[(j, key)] = None
+            else:
+                self.columns[key] = array('i', [-1]) * i
+        string_pos = [n for n, key in enumerate(names) if key in self.columns]
+        flag_pos = [n for n, key in enumerate(names) if key in FLAG_BITS]
+        missing = [key for key in self.keys if key not in names]
+        return (tuple_getter(string_pos), [self.columns[names[n]] for n in string_pos],
+                tuple_getter(flag_pos), tuple(FLAG_BITS[names[n]] for n in flag_pos),
+                names.index('bounds') if 'bounds' in names else None, missing, {})
+
+    def _flag_mask(self, i, flag_bits, fv):
+        """Flag bits of node, values other than true/false are kept as raw values"""
+        mask = 0
+        for bit, v in zip(flag_bits, fv):
+            if v == 'true':
+                mask |= bit
+            elif v != 'false':
+                self.extra[(i, FLAGS[bit.bit_length() - 1])] = v
+        return mask
+
+    def get(self, i, key, resolve=True):
+        """Property value of node, None if node has no such property, '' for values left in the file unless resolve"""
+        if self.extra and (i, key) in self.extra:
+            v = self.extra[(i, key)]
+            if isinstance(v, Deferred):
+                return self.deferred_value(i, key, v.offset) if resolve else ''
+            return v
+        bit = FLAG_BITS.get(key)
+        if bit is not None:
+            return 'true' if self.flags[i] & bit else 'false'
+        if key == 'bounds':
+            return '[{},{}][{},{}]'.format(self.left[i], self.top[i], self.right[i], self.bottom[i])
+        col = self.columns.get(key)
+        if col is None or col[i] < 0:
+            return None
+        return self.strings[col[i]]
+
+    def deferred_value(self, i, key, offset):
+        """Property value left in the dump file, parsed from the start tag of node at offset"""
+        value = self.deferred.get((i, key))
+        if value is not None:
+            return value
+        found = []
+
+        def start_element(name, a):
+            found.append(a)
+            raise _Found()
+
+        parser = expat.ParserCreate()
+        parser.ordered_attributes = True
+        parser.StartElementHandler = start_element
+        path, base = self.source
+        with open(path, 'rb') as f:
+            f.seek(base + offset)
+            try:
+                for chunk in iter(lambda: f.read(1 << 16), b''):
+                    parser.Parse(chunk, False)
+            except _Found:
+                pass
+        if not found:
+            raise ValueError("No start tag at offset {} of {}".format(base + offset, path))
+        attrs = dict(zip(found[0][0::2], found[0][1::2]))
+        if len(self.deferred) >= 4:
+            self.deferred.clear()
+        value = self.deferred[(i, key)] = attrs.get(key)
+        return value
+
+    def value(self, i, key, resolve=True):
+        """Property value of node, empty string if node has no such property"""
+        v = self.get(i, key, resolve)
+        return '' if v is None else v
+
+    def is_deferred(self, i, key):
+        """Whether property value of node is left in the dump file"""
+        return bool(self.extra) and isinstance(self.extra.get((i, key)), Deferred)
+
+    def flag(self, i, name):
+        """Boolean property of node"""
+        return self.get(i, name) == 'true'
+
+    def rect(self, i):
+        """Bounds of node as (left, top, right, bottom)"""
+        return self.left[i], self.top[i], self.right[i], self.bottom[i]
+
+    def link(self):
+        """Build child lists from parent column, top nodes are children of -1"""
+        n = len(self)
+        self.row = array('i', [0]) * n  # Position of node among its siblings
+        counts = array('i', [0]) * (n + 1)  # Child count per node, top nodes counted at n
+        for i, p in enumerate(self.parent):
+            slot = p if p >= 0 else n
+            self.row[i] = counts[slot]
+            counts[slot] += 1
+        self.child_start = array('i', [0]) * (n + 2)
+        for slot in range(n + 1):
+            self.child_start[slot + 1] = self.child_start[slot] + counts[slot]
+        self.child_nodes = array('i', [0]) * n
+        for i, p in enumerate(self.parent):
+            slot = p if p >= 0 else n
+            self.child_nodes[self.child_start[slot] + self.row[i]] = i
+
+    def child_count(self, p):
+        """Number of children of node, top nodes for -1"""
+        slot = p if p >= 0 else len(self)
+        return self.child_start[slot + 1] - self.child_start[slot]
+
+    def child(self, p, row):
+        """Child node at row of node, top node at row for -1"""
+        slot = p if p >= 0 else len(self)
+        return self.child_nodes[self.child_start[slot] + row]
+
+    def children(self, p):
+        """Child nodes of node, top nodes for -1"""
+        slot = p if p >= 0 else len(self)
+        return self.child_nodes[self.child_start[slot]:self.child_start[slot + 1]]
+
+    def count_values(self):
+        """Build frequency maps of the properties used by selectors"""
+        self.counts = {}
+        for key in ('content-desc', 'text', 'class', 'resource-id'):
+            self.counts[key] = Counter(self.columns.get(key, ()))
+
+    def is_unique(self, i, key):
+        """Whether no other node has the same non-empty value of property"""
+        col = self.columns.get(key)
+        if col is None or col[i] < 0 or self.strings[col[i]] == '':
+            return False
+        return self.counts[key][col[i]] == 1
+
+    def selectors(self, i):
+        """Get (indicator, uiaSelector, xpath) of node, values left in the dump file count as empty"""
+        desc = self.value(i, 'content-desc', False)
+        text = self.value(i, 'text', False)
+        cls = self.value(i, 'class')
+        rid = self.value(i, 'resource-id', False)
+        indicator = uia = xpath = ""
+        # Get uiautomator indicator: description < text < className < resourceId
+        # uiautomator indicator: for example self.device(indicator) can locate to single element
+        if self.is_unique(i, 'content-desc'):
+            indicator = 'description=\"{}\"'.format(desc)
+            uia = 'new UiSelector().description(\"{}\")'.format(desc)
+        if self.is_unique(i, 'text'):
+            indicator = 'text=\"{}\"'.format(text)
+            uia = 'new UiSelector().textContains(\"{}\")'.format(text)
+        cls_unique = self.is_unique(i, 'class')
+        if cls_unique:
+            indicator = 'className=\"{}\"'.format(cls)
+            uia = 'new UiSelector().className(\"{}\")'.format(cls)
+        rid_unique = self.is_unique(i, 'resource-id')
+        if rid_unique:
+            indicator = 'resourceId=\"{}\"'.format(rid)
+            uia = 'new UiSelector().resourceId(\"{}\")'.format(rid)
+
+        # Get xpath
+        if rid_unique:  # resourceId is indicator
+            xpath = '//' + cls + '[@resource-id=\"{}\"]'.format(rid)
+        elif cls_unique:  # className is indicator
+            xpath = '//' + cls
+        elif len(text) > 0 and len(desc) > 0:
+            xpath = '//' + cls + '[@text=\"{}\" and @content-desc=\"{}\"]'.format(text, desc)
+        elif len(text) > 0:
+            xpath = '//' + cls + '[@text=\"{}\"]'.format(text)
+        elif len(desc) > 0:
+            xpath = '//' + cls + '[@content-desc=\"{}\"]'.format(desc)
+
+        # Get uiaSelector
+        if indicator == "":
+            if len(rid) > 0:
+                if len(text) > 0:
+                    uia = 'new UiSelector().className(\"{}\").textContains(\"{}\").resourceId(' \
+                          '\"{}\")'.format(cls, text, rid)
+                else:
+                    uia = 'new UiSelector().className(\"{}\").resourceId(\"{}\")'.format(cls, rid)
+            elif len(text) > 0:
+                uia = 'new UiSelector().className(\"{}\").textContains(\"{}\")'.format(cls, text)
+        return indicator, uia, xpath
+
+    def full_index_xpath(self, i):
+        """Absolute xpath of node by class and position, from its top node down"""
+        steps = []
+        while i >= 0:
+            steps.append(self.value(i, 'class') + "[" + str(self.ordinal[i]) + "]")
+            i = self.parent[i]
+        steps.reverse()
+        return "//" + "/".join(steps)
+
+    def find_full_index_xpath(self, xpath):
+        """Node at absolute xpath from full_index_xpath(), None if this dump has no such node"""
+        p = -1
+        for step in xpath[2:].split('/'):
+            cls, _, ordinal = step[:-1].rpartition('[')
+            for c in self.children(p):
+                if self.ordinal[c] == int(ordinal) and self.value(c, 'class') == cls:
+                    p = c
+                    break
+            else:
+                return None
+        return p if p >= 0 else None
+
+    def changed_nodes(self, other):
+        """Nodes with different properties in other dump of the same tree shape, None if tree shape differs"""
+        if self.parent != other.parent or set(self.keys) != set(other.keys):
+            return None
+        n = len(self)
+        changed = set()
+        for key in self.keys:
+            col = self.columns.get(key)
+            if col is None:
+                continue
+            # -1 picks the trailing None, a missing property
+            a = list(map((self.strings + [None]).__getitem__, col))
+            b = list(map((other.strings + [None]).__getitem__, other.columns[key]))
+            if a == b:
+                continue
+            if key == 'class':
+                return None  # Same shape but different nodes
+            changed.update(i for i in range(n) if a[i] != b[i])
+        for mine, theirs in ((self.flags, other.flags), (self.left, other.left), (self.top, other.top),
+                             (self.right, other.right), (self.bottom, other.bottom)):
+            if mine != theirs:
+                changed.update(i for i in range(n) if mine[i] != theirs[i])
+        if self.extra != other.extra:
+            changed.update(i for (i, key), v in set(self.extra.items()) ^ set(other.extra.items()))
+        return sorted(changed)
+
+    def node(self, i):
+        """All properties of node as dict, with xpath, fullIndexXpath, uiaSelector and indicator"""
+        d = {}
+        for key in self.keys:
+            v = self.get(i, key)
+            if v is not None:
+                d[key] = v
+        indicator, uia, xpath = self.selectors(i)
+        d['xpath'] = xpath
+        d['fullIndexXpath'] = self.full_index_xpath(i)
+        d['uiaSelector'] = uia
+        d['indicator'] = indicator
+        return d
+
+
+def parse_uix(source, max_value=None):
+    """Parse uiautomator dump (file path or bytes) in a single streaming pass
+
+    With max_value, string values longer than that are left in the dump file and read again when asked for,
+    the node table only holds their offset: memory is bound by node count, not by dump size. These values look
+    empty to selectors, locator queries and search.
+    """
+    if max_value is not None and isinstance(source, (bytes, bytearray)):
+        raise ValueError("Values can only be left in a dump file")
+    store = NodeStore()
+    stack = []  # Indexes of currently open nodes
+    seen = [{}]  # Child count per class for the root and every open node
+
+    def start_element(name, a):
+        if name != 'node':
+            return
+        # expat has decoded all entities and character references
+        deferred = None
+        if max_value is not None:
+            for n in range(1, len(a), 2):
+                if len(a[n]) > max_value and a[n - 1] not in FLAG_BITS and a[n - 1] not in ('bounds', 'class'):
+                    if deferred is None:
+                        deferred = []
+                        a = list(a)
+                    deferred.append(a[n - 1])
+                    a[n] = ''
+        i = store.add(stack[-1] if stack else -1, len(stack) + 1, a)
+        if deferred:
+            for key in deferred:
+                store.extra[(i, key)] = Deferred(parser.CurrentByteIndex)
+        counts = seen[-1]
+        cls = store.value(i, 'class')
+        counts[cls] = counts.get(cls, 0) + 1
+        store.ordinal.append(counts[cls])
+        stack.append(i)
+        seen.append({})
+
+    def end_element(name):
+        if name == 'node':
+            stack.pop()
+            seen.pop()
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.ordered_attributes = True
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    if isinstance(source, (bytes, bytearray)):
+        parser.Parse(source, True)
+    else:
+        with open(source, 'rb') as f:
+            parser.ParseFile(f)
+        if max_value is not None:
+            store.source = (os.path.abspath(source), 0)
+    store.link()
+    store.count_values()
+    return store
+
+
+def quoteattr(value):
+    """Quoted attribute value as xml.sax.saxutils.quoteattr, which imports urllib.request and slows startup"""
+    value = value.replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;")
+    value = value.replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+    if '"' not in value:
+        return '"' + value + '"'
+    if "'" not in value:
+        return "'" + value + "'"
+    return '"' + value.replace('"', "&quot;") + '"'
+
+
+def format_uix(source):
+    """Uiautomator dump (file path or bytes) as indented text, one element per line, in a single streaming pass"""
+    out = ["<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>"]
+    depth = [0]
+    pending = []  # Start tag not written yet, written as empty element if it has no children
+
+    def flush():
+        if pending:
+            out.append(pending.pop() + ">")
+
+    def start_element(name, a):
+        flush()
+        attrs = "".join(" {}={}".format(a[n], quoteattr(a[n + 1])) for n in range(0, len(a), 2))
+        pending.append("\n" + "  " * depth[0] + "<" + name + attrs)
+        depth[0] += 1
+
+    def end_element(name):
+        depth[0] -= 1
+        if pending:
+            out.append(pending.pop() + " />")
+        else:
+            out.append("\n" + "  " * depth[0] + "</" + name + ">")
+
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.ordered_attributes = True
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    if isinstance(source, (bytes, bytearray)):
+        parser.Parse(source, True)
+    else:
+        with open(source, 'rb') as f:
+            parser.ParseFile(f)
+    out.append("\n")
+    return "".join(out)
+
+
+class SpatialIndex(object):
+    """Uniform grid over element rectangles to find the smallest element containing a point"""
+
+    CELLS = 64  # Grid cells along the longer side of the screen
+    LARGE = 64  # Rectangles covering more cells than this are kept out of the grid
+
+    def __init__(self, nodes):
+        self.left, self.top, self.right, self.bottom = nodes.left, nodes.top, nodes.right, nodes.bottom
+        self.area = [(r - l) * (b - t) for l, t, r, b in zip(self.left, self.top, self.right, self.bottom)]
+        width = max(max(self.right, default=0), 1)
+        height = max(max(self.bottom, default=0), 1)
+        self.cell = max(1, -(-max(width, height) // self.CELLS))
+        self.cols = width // self.cell + 1
+        self.rows = height // self.cell + 1
+        self.grid = [[] for _ in range(self.cols * self.rows)]
+        self.large = []
+        # Insert in sorted order, so every cell list is sorted as well
+        for i in sorted(range(len(self.area)), key=self._key):
+            l, t, r, b = self.left[i], self.top[i], self.right[i], self.bottom[i]
+            if r < l or b < t:
+                continue  # Empty rectangle never contains a point
+            c0, r0 = self._cell(l, t)
+            c1, r1 = self._cell(r, b)
+            if (c1 - c0 + 1) * (r1 - r0 + 1) > self.LARGE:
+                self.large.append(i)
+                continue
+            for row in range(r0, r1 + 1):
+                base = row * self.cols
+                for col in range(c0, c1 + 1):
+                    self.grid[base + col].append(i)
+
+    def grid_arrays(self):
+        """Cell lists as (cell start offsets, cell items, large list) arrays, see from_grid_arrays()"""
+        start = array('i', [0]) * (len(self.grid) + 1)
+        items = array('i')
+        for c, cell in enumerate(self.grid):
+            items.extend(cell)
+            start[c + 1] = len(items)
+        return start, items, array('i', self.large)
+
+    @classmethod
+    def from_grid_arrays(cls, nodes, cell, cols, rows, start, items, large):
+        """Index of nodes from saved grid_arrays(), without sorting and inserting the rectangles again"""
+        index = cls.__new__(cls)
+        index.left, index.top, index.right, index.bottom = nodes.left, nodes.top, nodes.right, nodes.bottom
+        index.area = [(r - l) * (b - t) for l, t, r, b in zip(index.left, index.top, index.right, index.bottom)]
+        index.cell, index.cols, index.rows = cell, cols, rows
+        items = items.tolist()
+        index.grid = [items[start[c]:start[c + 1]] for c in range(len(start) - 1)]
+        index.large = large.tolist()
+        return index
+
+    def _key(self, i):
+        """Smaller area first, and the later element first for equal areas"""
+        return self.area[i], -i
+
+    def _cells(self, i):
+        """Grid cell lists of element, the large list if it covers too many cells, nothing if it is empty"""
+        l, t, r, b = self.left[i], self.top[i], self.right[i], self.bottom[i]
+        if r < l or b < t:
+            return []
+        c0, r0 = self._cell(l, t)
+        c1, r1 = self._cell(r, b)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > self.LARGE:
+            return [self.large]
+        return [self.grid[row * self.cols + col] for row in range(r0, r1 + 1) for col in range(c0, c1 + 1)]
+
+    def update(self, nodes, changed):
+        """Move changed elements to their rectangles in nodes, a dump with the same tree as the indexed one"""
+        left, top, right, bottom = nodes.left, nodes.top, nodes.right, nodes.bottom
+        moved = [i for i in changed if (self.left[i], self.top[i], self.right[i], self.bottom[i]) !=
+                 (left[i], top[i], right[i], bottom[i])]
+        for i in moved:
+            for cell in self._cells(i):
+                cell.remove(i)
+        self.left, self.top, self.right, self.bottom = left, top, right, bottom
+        for i in moved:
+            self.area[i] = (right[i] - left[i]) * (bottom[i] - top[i])
+            key = self._key(i)
+            for cell in self._cells(i):
+                lo, hi = 0, len(cell)
+                while lo < hi:  # Keep cell sorted by key
+                    mid = (lo + hi) // 2
+                    if self._key(cell[mid]) < key:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                cell.insert(lo, i)
+
+    def _cell(self, x, y):
+        """Grid column and row for point, clamped to the grid"""
+        col = min(max(x // self.cell, 0), self.cols - 1)
+        row = min(max(y // self.cell, 0), self.rows - 1)
+        return col, row
+
+    def _first(self, candidates, x, y, limit=None):
+        """First candidate containing the point, candidates sorted by area"""
+        left, top, right, bottom = self.left, self.top, self.right, self.bottom
+        for i in candidates:
+            if limit is not None and self._key(i) >= limit:
+                return None
+            if left[i] <= x <= right[i] and top[i] <= y <= bottom[i]:
+                return i
+        return None
+
+    def find(self, x, y, max_area=None):
+        """Index of the smallest element containing point (x, y), None if not found"""
+        col, row = self._cell(x, y)
+        found = self._first(self.grid[row * self.cols + col], x, y)
+        limit = self._key(found) if found is not None else None
+        large = self._first(self.large, x, y, limit)
+        if large is not None:
+            found = large
+        if found is not None and max_area is not None and self.area[found] > max_area:
+            return None
+        return found
+
+
+def node_info(nodes, i, props=False):
+    """Node as JSON-friendly dict: position in tree, bounds and locators"""
+    indicator, uia, xpath = nodes.selectors(i)
+    info = {
+        'node': i,
+        'parent': nodes.parent[i],
+        'depth': nodes.depth[i],
+        'class': nodes.value(i, 'class'),
+        'bounds': list(nodes.rect(i)),
+        'indicator': indicator,
+        'uiaSelector': uia,
+        'xpath': xpath,
+        'fullIndexXpath': nodes.full_index_xpath(i),
+    }
+    if props:
+        info['props'] = dict((key, nodes.get(i, key)) for key in nodes.keys if nodes.get(i, key) is not None)
+    return info
+
+
+def main(argv=None):
+    """Command line: print nodes of uiautomator dumps as JSON Lines, or the node at a point"""
+    ap = argparse.ArgumentParser(description="Parse uiautomator dumps (.uix/.xml) and print nodes as JSON Lines")
+    ap.add_argument('dumps', nargs='+', help="uiautomator dump files")
+    ap.add_argument('--point', nargs=2, type=int, metavar=('X', 'Y'),
+                    help="only print the smallest node containing point X,Y")
+    ap.add_argument('--props', action='store_true', help="include all node properties")
+    args = ap.parse_args(argv)
+
+    out = sys.stdout
+    for path in args.dumps:
+        nodes = parse_uix(path)
+        if args.point:
+            i = SpatialIndex(nodes).find(args.point[0], args.point[1])
+            info = node_info(nodes, i, args.props) if i is not None else {'node': None}
+            info['file'] = path
+            out.write(json.dumps(info, ensure_ascii=False) + "\n")
+            continue
+        for i in range(len(nodes)):
+            info = node_info(nodes, i, args.props)
+            info['file'] = path
+            out.write(json.dumps(info, ensure_ascii=False) + "\n")
+    out.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+# File: uix_query.py
+# Environment: Python3.6
+# Description: Evaluate UiSelector chains, uiautomator2 indicators and simple xpaths against a parsed dump, without Qt
+
+import sys, json, argparse
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, Counter, OrderedDict
+from itertools import chain, repeat
+
+from uix_engine import parse_uix, FLAG_BITS
+
+# UiSelector method -> (property, how the argument is compared)
+STRING_METHODS = {
+    'text': ('text', 'equals'), 'textContains': ('text', 'contains'), 'textStartsWith': ('text', 'startswith'),
+    'textMatches': ('text', 'matches'),
+    'description': ('content-desc', 'equals'), 'descriptionContains': ('content-desc', 'contains'),
+    'descriptionStartsWith': ('content-desc', 'startswith'), 'descriptionMatches': ('content-desc', 'matches'),
+    'className': ('class', 'equals'), 'classNameMatches': ('class', 'matches'),
+    'resourceId': ('resource-id', 'equals'), 'resourceIdMatches': ('resource-id', 'matches'),
+    'packageName': ('package', 'equals'), 'packageNameMatches': ('package', 'matches'),
+    'index': ('index', 'equals'),
+}
+FLAG_METHODS = {'checkable': 'checkable', 'checked': 'checked', 'clickable': 'clickable', 'enabled': 'enabled',
+                'focusable': 'focusable', 'focused': 'focused', 'scrollable': 'scrollable',
+                'longClickable': 'long-clickable', 'selected': 'selected'}
+
+UISELECTOR_RE = re.compile(r'^\s*new\s+UiSelector\(\)\s*')
+UISELECTOR_CALL_RE = re.compile(r'\.(\w+)\((?:"(.*?)"|(-?\d+)|(true|false))\)(?=\s*\.|\s*$)', re.S)
+INDICATOR_RE = re.compile(r'^(\w+)="(.*)"$', re.S)
+XPATH_PRED = r'\[(?:[^\[\]"]|"[^"]*")*\]'  # Brackets inside quoted values do not end the predicate
+XPATH_STEP_RE = re.compile(r'(//?)([\w.$*]+)((?:' + XPATH_PRED + r')*)')
+XPATH_PRED_RE = re.compile(XPATH_PRED)
+XPATH_ATTR_RE = re.compile(r'@([\w-]+)\s*=\s*"(.*?)"(?=\s+and\s+@|\s*$)', re.S)
+
+SEARCH_KEYS = ('text', 'content-desc', 'resource-id', 'class')  # Properties the search box looks in
+WORD_RE = re.compile(r'[^\W_]+')  # Letters and digits, ids like com.app:id/send_button are split too
+CAMEL_RE = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')  # Parts of camel case words, TextView -> Text, View
+
+
+class QueryEngine(object):
+    """Find the nodes matching a locator, with value indexes built on first use per property"""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.postings = {}  # Property -> string id -> nodes with that value, in document order
+        self.joined = {}  # Property -> (distinct values joined by NUL, start offset of each value, string ids)
+        self.paths = None  # Hashes of class and position paths ending at every node, see _index_paths()
+
+    def _postings(self, key):
+        """Nodes by string id of property"""
+        postings = self.postings.get(key)
+        if postings is None:
+            postings = self.postings[key] = defaultdict(list)
+            for i, sid in enumerate(self.nodes.columns.get(key, ())):
+                postings[sid].append(i)
+        return postings
+
+    def _joined(self, key):
+        """All distinct values of property in one string, for substring search in C"""
+        joined = self.joined.get(key)
+        if joined is None:
+            sids = [sid for sid in self._postings(key) if sid >= 0]
+            starts = []
+            pos = 0
+            for sid in sids:
+                starts.append(pos)
+                pos += len(self.nodes.strings[sid]) + 1
+            joined = self.joined[key] = ('\0'.join(self.nodes.strings[sid] for sid in sids), starts, sids)
+        return joined
+
+    def _values(self, key, how, arg):
+        """String ids of the values of property that match"""
+        strings = self.nodes.strings
+        if how == 'equals':
+            sid = self.nodes.string_ids.get(arg)
+            return [sid] if sid is not None and sid in self._postings(key) else []
+        text, starts, sids = self._joined(key)
+        if arg == '' and how in ('contains', 'startswith'):
+            return sids
+        if how == 'contains' and '\0' not in arg:
+            found = []
+            pos = text.find(arg)
+            while pos >= 0:
+                n = bisect_right(starts, pos) - 1
+                if pos + len(arg) <= starts[n] + len(strings[sids[n]]):  # Not across two values
+                    found.append(sids[n])
+                    pos = starts[n + 1] if n + 1 < len(starts) else len(text)  # Next value
+                else:
+                    pos += 1
+                pos = text.find(arg, pos)
+            return found
+        if how == 'startswith':
+            return [sid for sid in sids if strings[sid].startswith(arg)]
+        if how == 'matches':
+            pattern = re.compile(arg, re.S)
+            return [sid for sid in sids if pattern.fullmatch(strings[sid])]
+        return [sid for sid in sids if arg in strings[sid]]
+
+    def _property(self, key, how, arg, within=None):
+        """Nodes whose property matches, restricted to within (sorted nodes) if given"""
+        nodes = self.nodes
+        if key not in nodes.columns:
+            # Not a string column (bounds or no such property), check every node
+            test = self._test(how, arg)
+            return [i for i in (within if within is not None else range(len(nodes)))
+                    if nodes.get(i, key) is not None and test(nodes.get(i, key))]
+        return self._with_values(key, self._values(key, how, arg), within)
+
+    def _with_values(self, key, sids, within=None):
+        """Nodes with one of the string ids as property value, restricted to within (sorted nodes) if given"""
+        postings = self._postings(key)
+        if within is not None and len(within) <= sum(len(postings[sid]) for sid in sids):
+            # Fewer nodes left than value matches, check the left ones
+            col = self.nodes.columns[key]
+            sids = set(sids)
+            return [i for i in within if col[i] in sids]
+        found = []
+        for sid in sids:
+            found.extend(postings[sid])
+        if len(sids) > 1:
+            found.sort()
+        if within is not None:
+            # Keep value matches which are in within, by binary search
+            found = [i for i in found if within[min(bisect_left(within, i), len(within) - 1)] == i]
+        return found
+
+    @staticmethod
+    def _test(how, arg):
+        if how == 'equals':
+            return lambda v: v == arg
+        if how == 'contains':
+            return lambda v: arg in v
+        if how == 'startswith':
+            return lambda v: v.startswith(arg)
+        pattern = re.compile(arg, re.S)
+        return lambda v: pattern.fullmatch(v) is not None
+
+    def _flag(self, key, value, within=None):
+        """Nodes whose boolean property is value"""
+        nodes = self.nodes
+        want = 'true' if value else 'false'
+        return [i for i in (within if within is not None else range(len(nodes))) if nodes.get(i, key) == want]
+
+    def _conditions(self, conditions):
+        """Nodes matching all UiSelector (method, argument) conditions, in document order"""
+        tests = []
+        instance = None
+        for method, arg in conditions:
+            if method == 'instance':
+                instance = int(arg)
+            elif method in STRING_METHODS:
+                tests.append(STRING_METHODS[method] + (str(arg),))
+            elif method in FLAG_METHODS:
+                tests.append((FLAG_METHODS[method], 'equals', 'true' if arg in (True, 'true') else 'false'))
+            else:
+                raise ValueError("Unsupported selector method: " + method)
+        found = self._match_all(tests)
+        if instance is not None:
+            found = found[instance:instance + 1]
+        return found
+
+    def _match_all(self, tests, within=None):
+        """Nodes matching all (property, how, argument) tests, restricted to within (sorted nodes) if given"""
+        indexed = []  # (match count, property, string ids) of tests on string columns
+        others = []
+        for key, how, arg in tests:
+            if key in self.nodes.columns:
+                sids = self._values(key, how, arg)
+                postings = self._postings(key)
+                indexed.append((sum(len(postings[sid]) for sid in sids), key, sids))
+            else:
+                others.append((key, how, arg))
+        found = within
+        # Fewest matches first, the other tests only check what is left
+        for count, key, sids in sorted(indexed, key=lambda t: t[0]):
+            found = self._with_values(key, sids, found)
+        for key, how, arg in others:
+            if key in FLAG_BITS:
+                found = self._flag(key, arg == 'true', found)
+            else:
+                found = self._property(key, how, arg, found)
+        return found if found is not None else list(range(len(self.nodes)))
+
+    def uiselector(self, query):
+        """Nodes matching a 'new UiSelector()...' chain"""
+        m = UISELECTOR_RE.match(query)
+        if m is None:
+            raise ValueError("Not a UiSelector: " + query)
+        rest = query[m.end():]
+        conditions = []
+        pos = 0
+        for call in UISELECTOR_CALL_RE.finditer(rest):
+            if rest[pos:call.start()].strip():
+                raise ValueError("Can not parse UiSelector at: " + rest[pos:])
+            method, string, number, boolean = call.groups()
+            conditions.append((method, string if string is not None else
+                               int(number) if number is not None else boolean == 'true'))
+            pos = call.end()
+        if rest[pos:].strip():
+            raise ValueError("Can not parse UiSelector at: " + rest[pos:])
+        return self._conditions(conditions)
+
+    def indicator(self, query):
+        """Nodes matching a uiautomator2 keyword indicator, for example text="OK" """
+        m = INDICATOR_RE.match(query)
+        if m is None:
+            raise ValueError("Not an indicator: " + query)
+        return self._conditions([m.groups()])
+
+    def xpath(self, query):
+        """Nodes matching an xpath of class steps with [n] and [@attr="value" and ...] predicates"""
+        steps = []
+        pos = 0
+        for step in XPATH_STEP_RE.finditer(query):
+            if step.start() != pos:
+                break
+            axis, name, predicates = step.groups()
+            if axis != ('//' if not steps else '/'):
+                raise ValueError("Only the first xpath step can be, and must be, //: " + query)
+            steps.append((name, [p[1:-1].strip() for p in XPATH_PRED_RE.findall(predicates)]))
+            pos = step.end()
+        if not steps or pos != len(query):
+            raise ValueError("Unsupported xpath: " + query)
+        if all(name != '*' and len(preds) == 1 and preds[0].isdigit() for name, preds in steps):
+            return self._chain([(name, int(preds[0])) for name, preds in steps])
+
+        nodes = self.nodes
+        found = None
+        for name, predicates in steps:
+            tests = [('class', 'equals', name)] if name != '*' else []
+            if found is not None:
+                found = sorted(c for p in found for c in nodes.children(p))
+            for predicate in predicates:
+                if predicate.isdigit():
+                    found = self._position(self._match_all(tests, found), int(predicate))
+                    tests = []
+                else:
+                    tests.extend(self._attributes(predicate))
+            if tests or found is None:
+                found = self._match_all(tests, found)
+        return found
+
+    def _chain(self, steps):
+        """Nodes matching //class[n]/class[n]/..., like fullIndexXpath
+
+        Every node has a hash of its (class, position) path of each length up to it, so checking a candidate is
+        one comparison. Positions of class steps are the same as NodeStore.ordinal.
+        """
+        self._index_paths()
+        h = 0
+        for step in steps:
+            h = hash((step, h))
+        name, n = steps[-1]
+        length = len(steps)
+        return [i for i in self._property('class', 'equals', name)
+                if self.nodes.ordinal[i] == n and len(self.paths[i]) >= length and self.paths[i][length - 1] == h]
+
+    def _index_paths(self):
+        """Hash of the (class, position) path of each length ending at every node, and how often each occurs"""
+        if self.paths is not None:
+            return
+        nodes = self.nodes
+        self.paths = []
+        for i in range(len(nodes)):
+            key = (nodes.value(i, 'class'), nodes.ordinal[i])
+            p = nodes.parent[i]
+            up = (0,) + self.paths[p] if p >= 0 else (0,)
+            self.paths.append(tuple(map(hash, zip(repeat(key, len(up)), up))))
+        self.path_counts = Counter(chain.from_iterable(self.paths))
+        self.path_first = {}
+        for i in range(len(nodes) - 1, -1, -1):  # Earlier nodes overwrite later ones
+            self.path_first.update(zip(self.paths[i], repeat(i)))
+
+    def full_index_count(self, i):
+        """(count, first) of the nodes matching the fullIndexXpath of node i, without building the xpath"""
+        self._index_paths()
+        h = self.paths[i][-1]
+        return self.path_counts[h], self.path_first[h]
+
+    def _position(self, found, n):
+        """Nodes which are the n-th among their siblings in found"""
+        seen = defaultdict(int)
+        kept = []
+        for i in found:
+            seen[self.nodes.parent[i]] += 1
+            if seen[self.nodes.parent[i]] == n:
+                kept.append(i)
+        return kept
+
+    @staticmethod
+    def _attributes(predicate):
+        """Tests of an [@attr="value" and ...] predicate"""
+        attrs = XPATH_ATTR_RE.findall(predicate)
+        if not attrs or ' and '.join('@{}="{}"'.format(k, v) for k, v in attrs) != predicate:
+            raise ValueError("Unsupported xpath predicate: " + predicate)
+        return [(key, 'equals', value) for key, value in attrs]
+
+    def select(self, query):
+        """Nodes matching a UiSelector chain, xpath or indicator"""
+        if query.startswith('//'):
+            return self.xpath(query)
+        if UISELECTOR_RE.match(query):
+            return self.uiselector(query)
+        return self.indicator(query)
+
+
+class SearchIndex(object):
+    """Word prefix search over text, content-desc, resource-id and class, built once per dump
+
+    Every word of a value, and every part of a camel case word, is indexed lower case with the nodes having it.
+    A query matches the nodes having, for each of its words, an indexed word starting with it.
+    """
+
+    CACHED = 64  # Results of the last query words, typing one more letter mostly reuses them
+
+    def __init__(self, nodes, keys=SEARCH_KEYS):
+        self.nodes = nodes
+        cols = [nodes.columns[key] for key in keys if key in nodes.columns]
+        words = {}  # String id -> words of the value
+        for sid in set(chain.from_iterable(cols)):
+            if sid >= 0:
+                found = set(WORD_RE.findall(nodes.strings[sid]))
+                for word in list(found):
+                    found.update(CAMEL_RE.findall(word))
+                words[sid] = set(word.lower() for word in found)
+        postings = defaultdict(list)
+        for i, sids in enumerate(zip(*cols)):
+            seen = set()
+            for sid in sids:
+                if sid >= 0:
+                    seen.update(words[sid])
+            for word in seen:
+                postings[word].append(i)  # Nodes in document order
+        self.words = sorted(postings)
+        self.postings = [postings[word] for word in self.words]
+        self.cache = OrderedDict()
+
+    def _prefix(self, prefix):
+        """Nodes with a word starting with prefix, sorted"""
+        found = self.cache.get(prefix)
+        if found is not None:
+            self.cache.move_to_end(prefix)
+            return found
+        lo = bisect_left(self.words, prefix)
+        hi = bisect_left(self.words, prefix + '\uffff', lo)
+        if hi - lo == 1:
+            found = self.postings[lo]
+        else:
+            found = sorted(set(chain.from_iterable(self.postings[lo:hi])))
+        self.cache[prefix] = found
+        if len(self.cache) > self.CACHED:
+            self.cache.popitem(last=False)
+        return found
+
+    def search(self, query):
+        """Nodes matching all words of query in document order, None for a query without words"""
+        terms = set(word.lower() for word in WORD_RE.findall(query))
+        if not terms:
+            return None
+        found = sorted((self._prefix(term) for term in terms), key=len)
+        if len(found) == 1:
+            return found[0]
+        kept = set(found[0])
+        for other in found[1:]:
+            kept.intersection_update(other)
+            if not kept:
+                break
+        return sorted(kept)
+
+
+def verify(nodes, engine=None):
+    """Match count of the locators of every node, and whether the node is the first match
+
+    Yields dicts with node and, per locator, [count, first] where first tells the node is the one found first.
+    """
+    engine = engine or QueryEngine(nodes)
+    results = {}  # The same locator is generated for many nodes
+    for i in range(len(nodes)):
+        indicator, uia, xpath = nodes.selectors(i)
+        report = {'node': i}
+        for name, query in (('indicator', indicator), ('uiaSelector', uia), ('xpath', xpath)):
+            if not query:
+                continue
+            found = results.get(query)
+            if found is None:
+                try:
+                    found = results[query] = engine.select(query)
+                except (ValueError, re.error):
+                    found = results[query] = None
+            report[name] = [len(found), bool(found) and found[0] == i] if found is not None else None
+        count, first = engine.full_index_count(i)
+        report['fullIndexXpath'] = [count, first == i]
+        yield report
+
+
+def main(argv=None):
+    """Command line: nodes matching a locator, or verify the generated locators of every node"""
+    ap = argparse.ArgumentParser(description="Evaluate UiSelector, indicator and xpath locators on a uiautomator dump")
+    ap.add_argument('dump', help="uiautomator dump file")
+    ap.add_argument('query', nargs='?', help="locator, for example 'new UiSelector().text(\"OK\")' or '//x[@text=\"OK\"]'")
+    ap.add_argument('--verify', action='store_true',
+                    help="match count of indicator, uiaSelector, xpath and fullIndexXpath of every node")
+    args = ap.parse_args(argv)
+
+    nodes = parse_uix(args.dump)
+    out = sys.stdout
+    if args.verify:
+        ambiguous = 0
+        for report in verify(nodes):
+            if any(isinstance(v, list) and v[0] != 1 for v in report.values()):
+                ambiguous += 1
+            out.write(json.dumps(report) + "\n")
+        out.write(json.dumps({'nodes': len(nodes), 'ambiguous': ambiguous, 'summary': True}) + "\n")
+    elif args.query:
+        for i in QueryEngine(nodes).select(args.query):
+            out.write(json.dumps({'node': i, 'class': nodes.value(i, 'class'), 'text': nodes.value(i, 'text'),
+                                  'bounds': list(nodes.rect(i))}, ensure_ascii=False) + "\n")
+    else:
+        ap.error("give a query or --verify")
+    out.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# File: uix_trace.py
+# Environment: Python3.6
+# Description: Named timing spans and counters for hot paths, saved as Chrome trace JSON, without Qt
+#
+# Tracing is off unless UIAUTOMATORHELPER_TRACE is set (to the trace file written on exit) or switched on in
+# the window. When off, a span is one attribute check returning a shared do-nothing context manager.
+
+import os, time, json, threading
+from collections import deque
+from functools import wraps
+
+
+class _NoSpan(object):
+    """Span used while tracing is off"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer, self.name, self.args = tracer, name, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class Tracer(object):
+    """Timing spans with per name statistics, and counters, kept while enabled"""
+
+    MAX_EVENTS = 200000  # Oldest events are dropped first, statistics keep counting
+
+    def __init__(self, enabled=False, path=None):
+        self.enabled = enabled
+        self.path = path  # Trace file written by save() without arguments
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget events, statistics and counters"""
+        self.events = deque(maxlen=self.MAX_EVENTS)  # (name, start, end, thread, args), counters with end None
+        self.stats = {}  # Span name -> [count, total seconds, last seconds, max seconds]
+        self.counters = {}
+
+    def span(self, name, **args):
+        """Context manager timing the code in it as span name"""
+        if not self.enabled:
+            return NO_SPAN
+        return _Span(self, name, args)
+
+    def traced(self, name):
+        """Decorator timing every call of a function as span name"""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*a, **k):
+                if not self.enabled:
+                    return func(*a, **k)
+                with _Span(self, name, {}):
+                    return func(*a, **k)
+            return wrapper
+        return decorate
+
+    def record(self, name, start, end, args=None):
+        """Add a finished span"""
+        took = end - start
+        with self.lock:
+            self.events.append((name, start, end, threading.get_ident(), args))
+            s = self.stats.get(name)
+            if s is None:
+                self.stats[name] = [1, took, took, took]
+            else:
+                s[0] += 1
+                s[1] += took
+                s[2] = took
+                if took > s[3]:
+                    s[3] = took
+
+    def count(self, name, value):
+        """Set counter to value"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = value
+            self.events.append((name, time.perf_counter(), None, 0, value))
+
+    def add(self, name, n=1):
+        """Increase counter by n"""
+        if self.enabled:
+            self.count(name, self.counters.get(name, 0) + n)
+
+    def rows(self):
+        """Statistics as (name, count, last ms, mean ms, max ms), spans by name, then (name, value) counters"""
+        with self.lock:
+            spans = [(name, s[0], s[2] * 1000, s[1] * 1000 / s[0], s[3] * 1000)
+                     for name, s in sorted(self.stats.items())]
+            counters = sorted(self.counters.items())
+        return spans, counters
+
+    def chrome_trace(self):
+        """Events in Chrome trace format, open with chrome://tracing or ui.perfetto.dev"""
+        pid = os.getpid()
+        out = []
+        with self.lock:
+            events = list(self.events)
+        for name, start, end, tid, args in events:
+            ts = round((start - self.origin) * 1e6, 1)
+            if end is None:
+                out.append({'name': name, 'ph': 'C', 'ts': ts, 'pid': pid, 'tid': 0, 'args': {name: args}})
+            else:
+                event = {'name': name, 'ph': 'X', 'ts': ts, 'dur': round((end - start) * 1e6, 1),
+                         'pid': pid, 'tid': tid}
+                if args:
+                    event['args'] = args
+                out.append(event)
+        return {'traceEvents': out, 'displayTimeUnit': 'ms'}
+
+    def save(self, path=None):
+        """Write Chrome trace JSON to path, or to the path given at start"""
+        path = path or self.path
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+# Shared tracer of the application
+tracer = Tracer(bool(os.environ.get('UIAUTOMATORHELPER_TRACE')), os.environ.get('UIAUTOMATORHELPER_TRACE') or None)